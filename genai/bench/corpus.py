@@ -0,0 +1,102 @@
+import csv
+import random
+from pathlib import Path
+
+from indexing import DATA_DIR, discover
+
+
+SYMPTOM_COLUMNS = ("Symptom Patterns", "Symptoms/Disorders", "Primary Conditions")
+
+NARRATIVES = (
+    "I have been suffering from {a} and {b} for {n} months",
+    "{age} year old with {a}, {b} and {c}",
+    "Patient reports {a}; also complains of {b}",
+    "{a} since last year, now {b} as well. What panchakarma plan do you suggest?",
+)
+
+# written by hand in patients' own words, not built from the CSVs, so they
+# show how the lexical fast path does on queries it was not tuned against
+HELD_OUT = (
+    "my lower back hurts every morning and it is hard to bend down",
+    "I get a burning feeling in my chest after spicy food",
+    "can't fall asleep at night, my mind keeps racing",
+    "knees are swollen and creak when I climb stairs",
+    "always tired, low energy even after sleeping ten hours",
+    "itchy red patches on my elbows that flake off",
+    "my periods are very painful and come late every month",
+    "constant headaches behind my eyes when I look at screens",
+    "I feel bloated and gassy after almost every meal",
+    "stuffy nose and sneezing every spring",
+    "my hair is falling out in clumps when I shower",
+    "I worry all the time and my heart races for no reason",
+    "hands and feet are always cold, even in summer",
+    "I have put on a lot of weight and feel sluggish",
+    "tingling and shooting pain down my left leg",
+    "stiff neck and shoulders from sitting at a desk all day",
+    "frequent loose motions and cramps in my stomach",
+    "dry cough that will not go away for weeks",
+    "my skin breaks out in pimples before my period",
+    "I forget things easily and can't concentrate at work",
+    "ringing in my ears that gets worse at night",
+    "sour burps and acid coming up into my throat",
+    "my joints ache in cold and damp weather",
+    "hard stools, I only go to the toilet every three days",
+    "trouble breathing when I climb stairs, wheezing at night",
+    "my eyes feel dry and gritty all day",
+    "hives that come and go after eating certain foods",
+    "sugar levels are high and I am thirsty all the time",
+    "feeling low and unmotivated, not enjoying anything",
+    "pain in my heel when I take the first steps in the morning",
+    "my fingers are stiff and swollen when I wake up",
+    "we have been trying to conceive for two years without success",
+    "heavy head and blocked sinuses every morning",
+    "I sweat a lot and feel hot all the time",
+    "loss of appetite and a coated tongue",
+    "twitching eyelid and muscle cramps in my calves",
+    "grey hair at 25 and my scalp is very dry",
+    "my face droops a little on one side since a viral fever last year",
+    "pain and grinding in my jaw when chewing",
+    "I get dizzy when I stand up quickly",
+)
+
+
+def held_out_corpus():
+    return [{"query": query, "kind": "held-out"} for query in HELD_OUT]
+
+
+def symptom_terms(data_dir=DATA_DIR):
+    """Symptom lists from the CSV columns, one list per row."""
+    rows = []
+    for path in discover(data_dir):
+        with open(Path(path), newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                for column in SYMPTOM_COLUMNS:
+                    terms = [t.strip() for t in (row.get(column) or "").split(",") if t.strip()]
+                    if terms:
+                        rows.append(terms)
+    return rows
+
+
+def build_corpus(size=500, seed=7, data_dir=DATA_DIR):
+    """Deterministic mix of patient-style queries built from the CSV symptom columns.
+
+    Each item is {"query", "kind"} where kind is one of
+    verbatim (a whole symptom cell), pair (two terms from one row, shuffled)
+    or narrative (terms wrapped in free text).
+    """
+    rng = random.Random(seed)
+    rows = symptom_terms(data_dir)
+    corpus = []
+    while len(corpus) < size:
+        terms = rng.choice(rows)
+        kind = rng.choice(("verbatim", "pair", "narrative"))
+        if kind == "verbatim":
+            query = ", ".join(terms)
+        elif kind == "pair":
+            picked = rng.sample(terms, min(2, len(terms)))
+            query = rng.choice((", ", " and ")).join(picked).lower()
+        else:
+            a, b, c = (rng.sample(terms, 3) if len(terms) >= 3 else (terms * 3)[:3])
+            query = rng.choice(NARRATIVES).format(a=a.lower(), b=b.lower(), c=c.lower(), n=rng.randint(2, 24), age=rng.randint(20, 75))
+        corpus.append({"query": query, "kind": kind})
+    return corpus
@@ -0,0 +1,210 @@
+"""Local stand-ins for the embedding model, the LLM and retrieval.
+
+Everything is deterministic for a given input (hash-seeded), so two runs
+over the same corpus do the same work, and latencies come from a seeded
+LatencyModel so runs are comparable against a saved baseline.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import numpy as np
+
+
+THERAPISTS = ["Dr. Suneera Banga", "Dr. Anju S. Chetia", "Dr. Madhu Harihar", "Dr. Ratna Hiremath", "Dr. Bhuvnesh Sharma"]
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+
+
+class LatencyModel:
+    """Seeded latency distribution: fixed, uniform or lognormal.
+
+    For lognormal, ``median_ms`` and ``p99_ms`` define the shape, which is
+    how upstream latencies are usually described.
+    """
+
+    def __init__(self, dist="lognormal", median_ms=100.0, p99_ms=None, seed=0):
+        self.dist = dist
+        self.median = median_ms / 1000
+        self.p99 = (p99_ms or median_ms * 3) / 1000
+        self.rng = random.Random(seed)
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        if self.dist == "fixed":
+            return self.median
+        if self.dist == "uniform":
+            return self.rng.uniform(0, 2 * self.median)
+        sigma = math.log(self.p99 / self.median) / 2.326
+        return self.rng.lognormvariate(math.log(self.median), sigma)
+
+    async def wait(self):
+        await asyncio.sleep(self.sample())
+
+
+class StageRecorder:
+    """Collects per-stage durations (seconds) across a run."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def timed(self, stage):
+        recorder = self
+
+        class _Timer:
+            async def __aenter__(self):
+                self.started = time.perf_counter()
+
+            async def __aexit__(self, *exc):
+                recorder.record(stage, time.perf_counter() - self.started)
+
+        return _Timer()
+
+    def reset(self):
+        self.samples.clear()
+
+
+class FakeEmbeddings:
+    """Deterministic unit vectors derived from the text hash."""
+
+    def __init__(self, dim=256, latency=None, recorder=None):
+        self.model = "fake-embedding"
+        self.dim = dim
+        self.latency = latency or LatencyModel(median_ms=0)
+        self.recorder = recorder or StageRecorder()
+        self.calls = 0
+
+    def _vector(self, text):
+        vector = np.random.default_rng(_seed(text)).normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+    async def aembed_documents(self, texts):
+        async with self.recorder.timed("embedding"):
+            self.calls += 1
+            await self.latency.wait()
+            return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+    async def aembed_queries(self, texts):
+        return await self.aembed_documents(texts)
+
+
+def fake_schedule(text):
+    """A valid ScheduleClassifier payload whose shape depends only on ``text``."""
+    rng = random.Random(_seed(text))
+    days = rng.randint(3, 14)
+    schedule = []
+    for day in range(1, days + 1):
+        consultation = day == 1 or day == days
+        plan = ["Physician/Ayurvedic doctor review and approval required."] if consultation else []
+        plan += [f"Therapy step {day}.{i}: light diet, rest and monitoring." for i in range(rng.randint(1, 4))]
+        schedule.append({
+            "day": day,
+            "doctor_consultation": "yes" if consultation else "no",
+            "plan": plan,
+            "therapist_name": None if consultation else rng.choice(THERAPISTS)
+        })
+    return json.dumps({"schedule": schedule})
+
+
+class FakeLLM:
+    """Quacks like ``AsyncOpenAI`` for ``beta.chat.completions.parse`` and ``.stream``."""
+
+    def __init__(self, latency=None, recorder=None, failure_rate=0.0, seed=0):
+        self.latency = latency or LatencyModel(median_ms=0)
+        self.recorder = recorder or StageRecorder()
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        completions = SimpleNamespace(parse=self.parse, stream=self.stream)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        self.chat = self.beta.chat
+
+    def _completion(self, messages, response_format):
+        from prompt_builder import count_tokens
+
+        text = fake_schedule(messages[-1]["content"])
+        parsed = response_format.model_validate_json(text)
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=count_tokens(text), prompt_tokens_details=None)
+        return text, SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed, content=text))], usage=usage)
+
+    def _maybe_fail(self):
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise RuntimeError("fake upstream error")
+
+    async def parse(self, *, model, messages, response_format, **kwargs):
+        async with self.recorder.timed("llm"):
+            self.calls += 1
+            await self.latency.wait()
+            self._maybe_fail()
+            return self._completion(messages, response_format)[1]
+
+    def stream(self, *, model, messages, response_format, **kwargs):
+        llm = self
+
+        class _Stream:
+            async def __aenter__(self):
+                llm.calls += 1
+                self.text, self.completion = llm._completion(messages, response_format)
+                return self
+
+            async def __aexit__(self, *exc):
+                pass
+
+            async def __aiter__(self):
+                total = llm.latency.sample()
+                chunks = [self.text[i:i + 40] for i in range(0, len(self.text), 40)]
+                # a fifth of the time to the first token, the rest spread over the chunks
+                await asyncio.sleep(total * 0.2)
+                llm._maybe_fail()
+                for chunk in chunks:
+                    await asyncio.sleep(total * 0.8 / len(chunks))
+                    yield SimpleNamespace(type="content.delta", delta=chunk)
+
+            async def get_final_completion(self):
+                return self.completion
+
+        return _Stream()
+
+
+class TimedRetriever:
+    """Wraps a retriever to record the whole retrieval stage (embedding included)."""
+
+    def __init__(self, retriever, recorder):
+        self.retriever = retriever
+        self.recorder = recorder
+        self.embedding = getattr(retriever, "embedding", None)
+
+    async def asimilarity_search(self, query, k=4, vector=None):
+        async with self.recorder.timed("retrieval"):
+            return await self.retriever.asimilarity_search(query, k=k, vector=vector)
+
+    async def abatch_similarity_search(self, queries, k=4):
+        async with self.recorder.timed("retrieval"):
+            return await self.retriever.abatch_similarity_search(queries, k=k)
+
+    async def asimilarity_search_by_vector(self, vector, k=4):
+        return await self.retriever.asimilarity_search_by_vector(vector, k=k)
+
+    async def aclose(self):
+        await self.retriever.aclose()
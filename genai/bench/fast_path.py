@@ -0,0 +1,52 @@
+"""Share of queries the hybrid retriever answers without an embedding call.
+
+    python -m bench.fast_path [--size 500] [--min-coverage 0.8]
+
+The generated corpus is built from the same CSV columns BM25 indexes, so it
+flatters the fast path; the held-out free-text queries are the number to
+quote for real traffic.
+"""
+import argparse
+import time
+from collections import Counter
+
+from bench.corpus import build_corpus, held_out_corpus
+from indexing import all_rows, discover
+from lexical_index import HybridRetriever, LexicalIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--min-coverage", type=float, default=0.8)
+    args = parser.parse_args()
+
+    index = LexicalIndex.from_rows(all_rows(discover()))
+    retriever = HybridRetriever(None, index, min_coverage=args.min_coverage)
+    generated = build_corpus(args.size, args.seed)
+    held_out = held_out_corpus()
+
+    total, fast = Counter(), Counter()
+    started = time.perf_counter()
+    for item in generated + held_out:
+        total[item["kind"]] += 1
+        if retriever.is_confident(*index.search(item["query"])):
+            fast[item["kind"]] += 1
+    elapsed = time.perf_counter() - started
+
+    def row(label, kinds):
+        count = sum(total[kind] for kind in kinds)
+        print(f"{label:<16} {count:>8} {sum(fast[kind] for kind in kinds) / count:>10.1%}")
+
+    generated_kinds = sorted({item["kind"] for item in generated})
+    print(f"{'kind':<16} {'queries':>8} {'fast path':>10}")
+    for kind in generated_kinds:
+        row(kind, [kind])
+    row("generated (all)", generated_kinds)
+    row("held-out", ["held-out"])
+    print(f"lexical search: {elapsed / (len(generated) + len(held_out)) * 1000:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Offline load test of POST /chat with local stand-ins for every upstream.
+
+    python -m bench.load                       # defaults, no network needed
+    python -m bench.load --concurrency 1,16,64 --requests 400 --save baseline.json
+    python -m bench.load --baseline baseline.json
+
+Gemini and OpenAI embeddings are replaced by bench.fakes with seeded
+latency distributions; retrieval runs against qdrant-client's in-memory
+mode or the NumPy index, built from the real CSVs. Requests go through
+the real FastAPI app in-process (httpx ASGITransport), so everything
+between the HTTP layer and the upstream calls is what production runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32,128", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--retrieval", choices=["qdrant-memory", "numpy"], default="qdrant-memory")
+    parser.add_argument("--hybrid", action="store_true", help="put the BM25 fast path in front of the vector search")
+    parser.add_argument("--cache", action="store_true", help="enable the in-process schedule cache")
+    parser.add_argument("--latency-dist", choices=["lognormal", "uniform", "fixed"], default="lognormal")
+    parser.add_argument("--llm-ms", type=float, default=300, help="median LLM latency")
+    parser.add_argument("--llm-p99-ms", type=float, default=1200)
+    parser.add_argument("--embed-ms", type=float, default=40, help="median embedding latency")
+    parser.add_argument("--embed-p99-ms", type=float, default=150)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of LLM calls that fail")
+    parser.add_argument("--hedge-after", default="auto", help='LLM_HEDGE_AFTER: seconds, "auto" or "off"')
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write results as JSON (use as a later --baseline)")
+    parser.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    # must happen before main is imported: main reads these at import time
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ["SCHEDULE_CACHE_BACKEND"] = "memory" if args.cache else "off"
+    os.environ["RETRIEVAL_BACKEND"] = "qdrant"
+    os.environ["RETRIEVAL_HYBRID"] = "0"
+    os.environ["LLM_HEDGE_AFTER"] = args.hedge_after
+
+
+async def build_retriever(args, embedding, rows):
+    from bench.fakes import FakeEmbeddings
+    from indexing import COLLECTION_NAME, upsert_rows
+
+    # same vectors as the runtime fake, but no latency while building the index
+    index_embedding = FakeEmbeddings(dim=embedding.dim)
+
+    if args.retrieval == "numpy":
+        from vector_index import NumpyVectorIndex, write_index
+
+        index_dir = tempfile.mkdtemp(prefix="bench-index-")
+        write_index(rows, index_embedding.embed_documents([content for _, content, _ in rows]), index_dir)
+        retriever = NumpyVectorIndex(embedding=embedding, index_dir=index_dir)
+    else:
+        from qdrant_client import AsyncQdrantClient
+        from retriever import QdrantRetriever
+
+        client = AsyncQdrantClient(location=":memory:")
+        await upsert_rows(client, index_embedding, COLLECTION_NAME, rows, batch_size=64, concurrency=4)
+        retriever = QdrantRetriever(embedding=embedding, client=client)
+
+    if args.hybrid:
+        from lexical_index import HybridRetriever, LexicalIndex
+
+        retriever = HybridRetriever(retriever, LexicalIndex.from_rows(rows))
+    return retriever
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(values.mean())}
+
+
+def counter_total(counter, **labels):
+    positions = {name: counter.labelnames.index(name) for name in labels}
+    return sum(
+        value for key, value in counter.values.items()
+        if all(key[positions[name]] == wanted for name, wanted in labels.items())
+    )
+
+
+def llm_counts(llm):
+    import metrics
+
+    return {
+        "calls": llm.calls,
+        "hedges": counter_total(metrics.llm_attempts, kind="hedge"),
+        "fallbacks": counter_total(metrics.llm_fallbacks)
+    }
+
+
+async def run_level(app, corpus, concurrency, requests, recorder, llm):
+    import httpx
+
+    recorder.reset()
+    before = llm_counts(llm)
+    latencies = []
+    errors = 0
+    next_request = iter(range(requests))
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def worker():
+            nonlocal errors
+            for i in next_request:
+                started = time.perf_counter()
+                response = await http.post("/chat", json={"message": corpus[i % len(corpus)]["query"]})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    after = llm_counts(llm)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "latency_ms": percentiles(latencies),
+        # per request; hedges and calls include the duplicates hedging starts
+        "llm": {name: (after[name] - before[name]) / requests for name in after},
+        "stages_ms": {stage: percentiles(samples) for stage, samples in sorted(recorder.samples.items())}
+    }
+
+
+def print_report(results, baseline=None):
+    baseline = {r["concurrency"]: r for r in baseline or []}
+
+    def delta(new, old):
+        return f" ({(new - old) / old:+.0%})" if old else ""
+
+    print(f"{'conc':>5} {'req/s':>14} {'p50 ms':>14} {'p95 ms':>14} {'p99 ms':>14} {'errors':>7} {'llm/req':>8} {'hedged':>7} {'fallbk':>7}")
+    for r in results:
+        old = baseline.get(r["concurrency"])
+        lat = r["latency_ms"]
+        cells = [f"{r['rps']:.1f}" + (delta(r["rps"], old["rps"]) if old else "")]
+        for key in ("p50", "p95", "p99"):
+            cells.append(f"{lat[key]:.1f}" + (delta(lat[key], old["latency_ms"][key]) if old else ""))
+        llm = r.get("llm", {"calls": 0, "hedges": 0, "fallbacks": 0})
+        print(
+            f"{r['concurrency']:>5} " + " ".join(f"{c:>14}" for c in cells) + f" {r['errors']:>7}"
+            f" {llm['calls']:>8.2f} {llm['hedges']:>7.1%} {llm['fallbacks']:>7.1%}"
+        )
+
+    print("\nper-stage breakdown (mean / p95 ms; retrieval includes embedding)")
+    for r in results:
+        stages = ", ".join(f"{name} {s['mean']:.1f}/{s['p95']:.1f}" for name, s in r["stages_ms"].items())
+        # retrieval already contains embedding, so only retrieval and llm add up to the request
+        accounted = sum(r["stages_ms"][name]["mean"] for name in ("retrieval", "llm") if name in r["stages_ms"])
+        print(f"{r['concurrency']:>5}: {stages}, other {r['latency_ms']['mean'] - accounted:.1f}")
+
+
+async def main():
+    args = parse_args()
+    configure_environment(args)
+
+    import main as genai
+    import server
+    from bench.corpus import build_corpus
+    from bench.fakes import FakeEmbeddings, FakeLLM, LatencyModel, StageRecorder, TimedRetriever
+    from indexing import all_rows, discover
+
+    recorder = StageRecorder()
+    embedding = FakeEmbeddings(
+        latency=LatencyModel(args.latency_dist, args.embed_ms, args.embed_p99_ms, seed=args.seed),
+        recorder=recorder
+    )
+    llm = FakeLLM(
+        latency=LatencyModel(args.latency_dist, args.llm_ms, args.llm_p99_ms, seed=args.seed + 1),
+        recorder=recorder,
+        failure_rate=args.failure_rate,
+        seed=args.seed
+    )
+
+    retriever = await build_retriever(args, embedding, all_rows(discover()))
+    genai.embedding_model = embedding
+    genai.vector_db = TimedRetriever(retriever, recorder)
+    genai.client = llm
+    # what the server's lifespan hook does, so no level pays for lazy setup
+    warmup_started = time.perf_counter()
+    await genai.warm_up()
+    warmup_ms = (time.perf_counter() - warmup_started) * 1000
+
+    corpus = build_corpus(args.corpus_size, args.seed)
+    results = []
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        results.append(await run_level(server.app, corpus, concurrency, args.requests, recorder, llm))
+
+    baseline = json.loads(open(args.baseline).read()) if args.baseline else None
+    print(
+        f"retrieval={args.retrieval}{'+hybrid' if args.hybrid else ''} cache={'on' if args.cache else 'off'} "
+        f"llm={args.llm_ms:.0f}/{args.llm_p99_ms:.0f}ms embed={args.embed_ms:.0f}/{args.embed_p99_ms:.0f}ms (median/p99) "
+        f"hedge-after={args.hedge_after} warm-up={warmup_ms:.0f}ms\n"
+    )
+    print_report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
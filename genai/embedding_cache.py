@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import metrics
+
+
+CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", Path(__file__).parent / ".cache" / "embeddings"))
+
+MAGIC = b"EMBC"
+HEADER = struct.Struct("<4sI8x")  # magic, dimension, padding -> 16 bytes
+KEY_BYTES = 32
+
+
+class EmbeddingStore:
+    """Append-only on-disk store of float32 vectors keyed by a sha256 digest.
+
+    The file is a 16 byte header followed by fixed-size records
+    (digest, vector), so it can be memory-mapped as a structured array and
+    appended to by several processes (indexer and server) without a
+    separate index file. Each record is written with a single append.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.dim = None
+        self._rows = {}
+        self._records = None
+        self._count = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _dtype(self):
+        return np.dtype([("key", f"V{KEY_BYTES}"), ("vector", "<f4", (self.dim,))])
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        size = self.path.stat().st_size
+        if size == self._size or size < HEADER.size:
+            return
+        with open(self.path, "rb") as f:
+            magic, dim = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an embedding cache file")
+        self.dim = dim
+
+        # a partially written trailing record (crash mid-append) is ignored
+        count = (size - HEADER.size) // self._dtype().itemsize
+        if count:
+            self._records = np.memmap(self.path, dtype=self._dtype(), mode="r", offset=HEADER.size, shape=(count,))
+            keys = self._records["key"]
+            for row in range(self._count, count):
+                self._rows.setdefault(bytes(keys[row]), row)
+            self._count = count
+        self._size = size
+
+    def get(self, digest):
+        row = self._rows.get(digest)
+        if row is None:
+            # another process may have appended since we mapped the file
+            with self._lock:
+                self._load()
+            row = self._rows.get(digest)
+            if row is None:
+                return None
+        return np.array(self._records["vector"][row])
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self._lock:
+            if self.dim is None:
+                self._load()
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    with open(self.path, "xb") as f:
+                        f.write(HEADER.pack(MAGIC, self.dim))
+                except FileExistsError:
+                    self._load()
+            records = np.empty(len(items), dtype=self._dtype())
+            for i, (digest, vector) in enumerate(items):
+                records[i]["key"] = np.void(digest)
+                records[i]["vector"] = vector
+            with open(self.path, "ab", buffering=0) as f:
+                f.write(records.tobytes())
+            self._load()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts it has never seen to the model.
+
+    Vectors are keyed by (model, sha256(text)); lookups go through an
+    in-memory LRU, then the on-disk store, and all misses of a call are
+    embedded in a single batched request. Only document embeddings are
+    written to disk: the corpus is bounded, patient queries are not, so
+    query vectors live in the LRU only.
+    """
+
+    def __init__(self, embeddings, model=None, cache_dir=CACHE_DIR, memory_size=4096):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        safe_model = re.sub(r"[^A-Za-z0-9._-]", "_", self.model)
+        self.store = EmbeddingStore(Path(cache_dir) / f"{safe_model}.f32")
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _digest(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).digest()
+
+    def _remember(self, digest, vector):
+        self._memory[digest] = vector
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, texts):
+        """Return (digests, vectors with None for misses, {digest: text} to embed)."""
+        digests = [self._digest(text) for text in texts]
+        vectors = []
+        missing = {}
+        for digest, text in zip(digests, texts):
+            vector = self._memory.get(digest)
+            if vector is not None:
+                self._memory.move_to_end(digest)
+                self.stats["memory_hits"] += 1
+            else:
+                vector = self.store.get(digest)
+                if vector is not None:
+                    self.stats["disk_hits"] += 1
+                    self._remember(digest, vector)
+                elif digest not in missing:
+                    missing[digest] = text
+            vectors.append(vector)
+        return digests, vectors, missing
+
+    def _new_vectors(self, missing, embedded):
+        self.stats["misses"] += len(missing)
+        return list(zip(missing, (np.asarray(v, dtype=np.float32) for v in embedded)))
+
+    def _fill(self, digests, vectors, new):
+        for digest, vector in new:
+            self._remember(digest, vector)
+        fresh = dict(new)
+        return [(v if v is not None else fresh[d]).tolist() for d, v in zip(digests, vectors)]
+
+    def embed_documents(self, texts):
+        digests, vectors, missing = self._lookup(texts)
+        embedded = []
+        if missing:
+            with metrics.stage("embedding"):
+                embedded = self.embeddings.embed_documents(list(missing.values()))
+        new = self._new_vectors(missing, embedded)
+        self.store.put_many(new)
+        return self._fill(digests, vectors, new)
+
+    async def aembed_documents(self, texts):
+        digests, vectors, missing = self._lookup(texts)
+        embedded = []
+        if missing:
+            with metrics.stage("embedding"):
+                embedded = await self.embeddings.aembed_documents(list(missing.values()))
+        new = self._new_vectors(missing, embedded)
+        if new:
+            # file I/O stays off the event loop
+            await asyncio.to_thread(self.store.put_many, new)
+        return self._fill(digests, vectors, new)
+
+    def embed_query(self, text):
+        digests, vectors, missing = self._lookup([text])
+        embedded = []
+        if missing:
+            with metrics.stage("embedding"):
+                embedded = [self.embeddings.embed_query(text)]
+        return self._fill(digests, vectors, self._new_vectors(missing, embedded))[0]
+
+    async def aembed_query(self, text):
+        digests, vectors, missing = self._lookup([text])
+        embedded = []
+        if missing:
+            with metrics.stage("embedding"):
+                embedded = [await self.embeddings.aembed_query(text)]
+        return self._fill(digests, vectors, self._new_vectors(missing, embedded))[0]
+
+    async def aembed_queries(self, texts):
+        """aembed_query for many texts: one request for all misses, and like
+        every query vector they stay in memory only."""
+        digests, vectors, missing = self._lookup(texts)
+        embedded = []
+        if missing:
+            with metrics.stage("embedding"):
+                # for OpenAI models a query is embedded exactly like a document
+                embedded = await self.embeddings.aembed_documents(list(missing.values()))
+        return self._fill(digests, vectors, self._new_vectors(missing, embedded))
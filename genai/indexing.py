@@ -1,49 +1,308 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+import uuid
+from itertools import islice
 from pathlib import Path
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from langchain_community.document_loaders.csv_loader import CSVLoader
 
 load_dotenv()
 
-pdf_path1 = Path(__file__).parent / "data1.csv"
-pdf_path2 = Path(__file__).parent / "data2.csv"
-pdf_path3 = Path(__file__).parent / "data3.csv"
-pdf_path4 = Path(__file__).parent / "data4.csv"
+DATA_DIR = Path(__file__).parent
+MANIFEST_PATH = DATA_DIR / ".cache" / "index-manifest.json"
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+COLLECTION_NAME = "panchkarma-new-data"
 
-#loading
-loader1 = CSVLoader(pdf_path1)
-docs1 = loader1.load()
+# namespace for turning a row's content hash into a Qdrant point id
+ROW_NAMESPACE = uuid.UUID("5d0c3f4e-8a51-4c4e-9a53-70616e63686b")
 
-loader2 = CSVLoader(pdf_path2)
-docs2 = loader2.load()
 
-loader3 = CSVLoader(pdf_path3)
-docs3 = loader3.load()
+def discover(data_dir=DATA_DIR):
+    return sorted(Path(data_dir).glob("data*.csv"))
 
-loader4 = CSVLoader(pdf_path4)
-docs4 = loader4.load()
 
+def file_digest(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
 
 
+def row_content(row):
+    # same text layout as langchain's CSVLoader, so retrieval quality is unchanged
+    lines = []
+    for key, value in row.items():
+        key = key.strip() if key is not None else key
+        if isinstance(value, list):
+            value = ",".join(v.strip() for v in value)
+        elif isinstance(value, str):
+            value = value.strip()
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
 
-docs = docs1 + docs2 + docs3 + docs4
 
+def row_id(content):
+    return str(uuid.uuid5(ROW_NAMESPACE, hashlib.sha256(content.encode()).hexdigest()))
 
-# vector embedding
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-small"
-)
 
+def iter_rows(path):
+    """Stream the rows of one CSV as (id, page_content, metadata)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            content = row_content(row)
+            yield row_id(content), content, {"source": str(path), "row": i}
 
 
-# Using [embedding_model] create embeddings of [split_docs] and store in DB
-vector_store = QdrantVectorStore.from_documents(
-    documents=docs,
-    url="http://localhost:6333",
-    collection_name="panchkarma-new-data",
-    embedding=embedding_model
-)
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
-print("INDEXING DONE")
 
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp, path)
+
+
+def plan(files, manifest, collection_name, full=False):
+    """Work out which files have to be re-read.
+
+    Returns (digests, changed files, ids of unchanged files). Files whose
+    content hash matches the manifest keep their recorded row ids without
+    being parsed again.
+    """
+    digests = {path.name: file_digest(path) for path in files}
+    known = manifest.get("files", {}) if manifest.get("collection") == collection_name and not full else {}
+
+    changed = []
+    kept_ids = {}
+    for path in files:
+        entry = known.get(path.name)
+        if entry and entry["sha256"] == digests[path.name]:
+            kept_ids[path.name] = entry["ids"]
+        else:
+            changed.append(path)
+    return digests, changed, kept_ids
+
+
+async def ensure_collection(client, collection_name, dim):
+    from qdrant_client import models
+
+    if not await client.collection_exists(collection_name):
+        await client.create_collection(
+            collection_name,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE)
+        )
+
+
+async def upsert_rows(client, embedding_model, collection_name, rows, batch_size, concurrency):
+    """Embed and upsert ``rows`` in batches with at most ``concurrency`` in flight."""
+    from qdrant_client import models
+
+    semaphore = asyncio.Semaphore(concurrency)
+    ready = asyncio.Event()
+    tasks = []
+    count = 0
+
+    async def upsert(batch, first):
+        try:
+            vectors = await embedding_model.aembed_documents([content for _, content, _ in batch])
+            if first:
+                await ensure_collection(client, collection_name, len(vectors[0]))
+                ready.set()
+            else:
+                await ready.wait()
+            await client.upsert(
+                collection_name=collection_name,
+                points=[
+                    models.PointStruct(id=id_, vector=vector, payload={"page_content": content, "metadata": metadata})
+                    for (id_, content, metadata), vector in zip(batch, vectors)
+                ]
+            )
+        finally:
+            if first:
+                ready.set()
+            semaphore.release()
+
+    for batch in batched(rows, batch_size):
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(upsert(batch, first=not tasks)))
+        count += len(batch)
+
+    await asyncio.gather(*tasks)
+    return count
+
+
+async def collection_count(url, collection_name):
+    """Exact point count, or None if the collection is missing or Qdrant is
+    unreachable. Plain REST so the no-op path doesn't import qdrant_client."""
+    import httpx
+
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=5) as http:
+            response = await http.post(f"/collections/{collection_name}/points/count", json={"exact": True})
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    return response.json()["result"]["count"]
+
+
+async def collection_ids(client, collection_name):
+    ids, offset = set(), None
+    while True:
+        points, offset = await client.scroll(
+            collection_name, limit=1024, offset=offset, with_payload=False, with_vectors=False
+        )
+        ids.update(str(point.id) for point in points)
+        if offset is None:
+            return ids
+
+
+def all_rows(files):
+    rows = {}
+    for path in files:
+        for id_, content, metadata in iter_rows(path):
+            rows.setdefault(id_, (id_, content, metadata))
+    return list(rows.values())
+
+
+async def write_numpy_index(embedding_model, rows, index_dir):
+    from vector_index import write_index
+
+    # every row was just embedded for Qdrant or earlier, so these are cache hits
+    vectors = await embedding_model.aembed_documents([content for _, content, _ in rows])
+    write_index(rows, vectors, index_dir)
+
+
+async def index(data_dir=DATA_DIR, collection_name=COLLECTION_NAME, url=QDRANT_URL,
+                batch_size=64, concurrency=4, full=False, manifest_path=MANIFEST_PATH,
+                backends=("qdrant", "numpy"), numpy_index_dir=None, lexical_index_path=None):
+    from vector_index import INDEX_DIR, index_exists
+    from lexical_index import INDEX_PATH, write_index as write_lexical_index
+
+    started = time.perf_counter()
+    backends = sorted(set(backends))
+    numpy_index_dir = Path(numpy_index_dir or INDEX_DIR)
+    lexical_index_path = Path(lexical_index_path or INDEX_PATH)
+    files = discover(data_dir)
+    manifest = load_manifest(manifest_path)
+    if manifest.get("backends", ["qdrant"]) != backends:
+        manifest = {}
+    digests, changed, kept_ids = plan(files, manifest, collection_name, full)
+
+    previous_ids = {id_ for entry in manifest.get("files", {}).values() for id_ in entry["ids"]}
+    if not full and manifest.get("collection") == collection_name and not changed \
+            and set(digests) == set(manifest.get("files", {})) and lexical_index_path.exists() \
+            and ("numpy" not in backends or index_exists(numpy_index_dir)) \
+            and ("qdrant" not in backends or await collection_count(url, collection_name) == len(previous_ids)):
+        print(f"Index up to date ({len(previous_ids)} rows, {time.perf_counter() - started:.3f}s)")
+        return
+
+    # heavy imports only when there is actual work to do
+    from langchain_openai import OpenAIEmbeddings
+    from qdrant_client import AsyncQdrantClient, models
+    from embedding_cache import CachedEmbeddings
+
+    # vector embedding (unchanged rows come from the local cache, not the API)
+    embedding_model = CachedEmbeddings(OpenAIEmbeddings(
+        model="text-embedding-3-small"
+    ))
+    client = AsyncQdrantClient(location=url) if "qdrant" in backends else None
+
+    if client is not None:
+        exists = await client.collection_exists(collection_name)
+        if full and exists:
+            await client.delete_collection(collection_name)
+        # the collection, not the manifest, says what is stored: it may predate
+        # the manifest (random ids from the old loader) or have been lost with
+        # a Qdrant restart
+        previous_ids = await collection_ids(client, collection_name) if exists and not full else set()
+        if not {id_ for ids in kept_ids.values() for id_ in ids} <= previous_ids:
+            # rows of unchanged files are missing: read every file again, the
+            # embedding cache keeps that cheap
+            changed, kept_ids = list(files), {}
+
+    file_ids = {name: list(ids) for name, ids in kept_ids.items()}
+    current_ids = {id_ for ids in kept_ids.values() for id_ in ids}
+
+    def new_rows():
+        # streams changed files row by row, yielding only rows the collection lacks
+        for path in changed:
+            ids = file_ids.setdefault(path.name, [])
+            for id_, content, metadata in iter_rows(path):
+                ids.append(id_)
+                if id_ in current_ids:
+                    continue
+                current_ids.add(id_)
+                if id_ not in previous_ids:
+                    yield id_, content, metadata
+
+    removed = []
+    if client is not None:
+        upserted = await upsert_rows(client, embedding_model, collection_name, new_rows(), batch_size, concurrency)
+
+        removed = sorted(previous_ids - current_ids)
+        for batch in batched(removed, 256):
+            await client.delete(collection_name, points_selector=models.PointIdsList(points=batch))
+        await client.close()
+    else:
+        upserted = sum(1 for _ in new_rows())
+
+    rows = all_rows(files)
+    write_lexical_index(rows, lexical_index_path)
+    if "numpy" in backends:
+        await write_numpy_index(embedding_model, rows, numpy_index_dir)
+
+    save_manifest({
+        "collection": collection_name,
+        "backends": backends,
+        "files": {name: {"sha256": digests[name], "ids": file_ids[name]} for name in digests}
+    }, manifest_path)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Indexed {len(changed)} changed file(s): {upserted} upserted, {len(removed)} deleted, "
+        f"{len(current_ids)} total rows in {elapsed:.2f}s ({upserted / elapsed:.1f} rows/sec); "
+        f"embedding cache {embedding_model.stats}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index data*.csv into Qdrant and/or a local NumPy index")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--url", default=QDRANT_URL)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--full", action="store_true", help="drop the collection and rebuild it")
+    parser.add_argument(
+        "--backend", choices=["qdrant", "numpy", "both"], default="both",
+        help="write the Qdrant collection, the local NumPy index used by RETRIEVAL_BACKEND=numpy, or both"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(index(
+        data_dir=args.data_dir,
+        collection_name=args.collection,
+        url=args.url,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        full=args.full,
+        backends=("qdrant", "numpy") if args.backend == "both" else (args.backend,)
+    ))
+    print("INDEXING DONE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from schedule_cache import STOPWORDS
+import metrics
+
+
+INDEX_PATH = Path(os.getenv("LEXICAL_INDEX_PATH", Path(__file__).parent / ".cache" / "lexical-index.json"))
+
+# CSV columns that name disorders and symptoms; only these are indexed lexically
+LEXICAL_COLUMNS = ("Disorder", "Symptom Patterns", "Symptoms/Disorders", "Primary Conditions")
+
+# conversational words patients wrap their symptoms in; they never appear in the symptom columns
+FILLER = STOPWORDS | {
+    "been", "feel", "feeling", "since", "days", "weeks", "months", "years", "year", "old", "lot",
+    "get", "getting", "now", "well", "as", "last", "reports", "complains", "complaining", "what",
+    "do", "you", "can", "please", "need", "help", "suggest", "plan", "treatment"
+}
+
+
+def tokenize(text):
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in FILLER or len(token) < 2 or token.isdigit():
+            continue
+        # crude plural folding: "headaches" -> "headache", but keep "stress", "sinus"
+        if len(token) > 4 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def lexical_text(page_content):
+    """Pull the disorder/symptom columns back out of a CSVLoader-style row text."""
+    fields = []
+    for line in page_content.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() in LEXICAL_COLUMNS:
+            fields.append(value)
+    return " ".join(fields)
+
+
+def index_entries(rows):
+    return [
+        {"id": id_, "page_content": content, "metadata": metadata, "tokens": tokenize(lexical_text(content))}
+        for id_, content, metadata in rows
+    ]
+
+
+def write_index(rows, path=INDEX_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index_entries(rows)))
+    os.replace(tmp, path)
+
+
+class LexicalIndex:
+    """BM25 over the disorder/symptom columns, tokenized at index time."""
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        return cls(json.loads(Path(path).read_text()))
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(index_entries(rows))
+
+    def __init__(self, entries):
+        # rows without any symptom columns (pure therapy metadata) are not searchable lexically
+        entries = [entry for entry in entries if entry["tokens"]]
+        self.documents = [Document(page_content=e["page_content"], metadata=e["metadata"]) for e in entries]
+        self.tokens = [set(e["tokens"]) for e in entries]
+        self.bm25 = BM25Okapi([e["tokens"] for e in entries])
+        self.max_idf = max(self.bm25.idf.values())
+
+    def search(self, query, k=4):
+        """Return (hits, coverage) where hits are (document, score) best first.
+
+        ``coverage`` is the IDF-weighted share of the query's terms that the
+        best hit contains. Terms the corpus has never seen count with the
+        highest weight, so free text the index cannot explain lowers it.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0.0
+
+        scores = self.bm25.get_scores(terms)
+        top = np.argsort(-scores)[:k]
+        hits = [(self.documents[i], float(scores[i])) for i in top if scores[i] > 0]
+        if not hits:
+            return [], 0.0
+
+        weights = {term: self.bm25.idf.get(term, self.max_idf) for term in terms}
+        matched = sum(w for term, w in weights.items() if term in self.tokens[top[0]])
+        return hits, matched / sum(weights.values())
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """Fuse ranked document lists; documents are identified by page_content."""
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document.page_content
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever:
+    """Lexical-first retrieval in front of a vector retriever.
+
+    When the best BM25 hit covers enough of the query (``min_coverage``)
+    its results are returned directly and the query is never embedded.
+    Otherwise the lexical and vector rankings are merged with reciprocal
+    rank fusion.
+    """
+
+    def __init__(self, vector_retriever, lexical_index, min_coverage=0.8):
+        self.vector_retriever = vector_retriever
+        self.lexical_index = lexical_index
+        self.min_coverage = min_coverage
+        self.stats = {"fast_path": 0, "fused": 0}
+
+    @property
+    def embedding(self):
+        return self.vector_retriever.embedding
+
+    def is_confident(self, hits, coverage):
+        return bool(hits) and coverage >= self.min_coverage
+
+    def _count(self, path):
+        self.stats[path] += 1
+        metrics.retrieval_path.inc(path=path)
+
+    async def asimilarity_search(self, query, k=4, vector=None):
+        with metrics.stage("lexical_search"):
+            hits, coverage = self.lexical_index.search(query, k)
+        if self.is_confident(hits, coverage):
+            self._count("fast_path")
+            return [document for document, _ in hits]
+
+        self._count("fused")
+        vector_documents = await self.vector_retriever.asimilarity_search(query, k=k, vector=vector)
+        return reciprocal_rank_fusion([document for document, _ in hits], vector_documents)[:k]
+
+    async def abatch_similarity_search(self, queries, k=4):
+        """Fast-path what BM25 can answer; embed and search the rest in one batch."""
+        with metrics.stage("lexical_search"):
+            lexical = [self.lexical_index.search(query, k) for query in queries]
+        results = [None] * len(queries)
+        fallback = []
+        for i, (hits, coverage) in enumerate(lexical):
+            if self.is_confident(hits, coverage):
+                self._count("fast_path")
+                results[i] = [document for document, _ in hits]
+            else:
+                self._count("fused")
+                fallback.append(i)
+
+        vector_results = await self.vector_retriever.abatch_similarity_search([queries[i] for i in fallback], k=k)
+        for i, vector_documents in zip(fallback, vector_results):
+            hits, _ = lexical[i]
+            results[i] = reciprocal_rank_fusion([document for document, _ in hits], vector_documents)[:k]
+        return results
+
+    async def asimilarity_search_by_vector(self, vector, k=4):
+        return await self.vector_retriever.asimilarity_search_by_vector(vector, k=k)
+
+    async def aclose(self):
+        await self.vector_retriever.aclose()
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+import metrics
+
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# empty disables the fallback; LLM_FALLBACK_BASE_URL/_API_KEY point it at another provider
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+LLM_FALLBACK_BASE_URL = os.getenv("LLM_FALLBACK_BASE_URL")
+LLM_FALLBACK_API_KEY = os.getenv("LLM_FALLBACK_API_KEY")
+
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+# how long a route may take before the next one gets the rest of the deadline
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "40"))
+# seconds, "auto" (rolling p95 of recent calls) or "off"
+LLM_HEDGE_AFTER = os.getenv("LLM_HEDGE_AFTER", "auto")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# auto hedging uses this until enough latencies have been seen
+DEFAULT_HEDGE_AFTER = 15.0
+MIN_HEDGE_SAMPLES = 20
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive errors; after ``cooldown``
+    seconds one trial call is let through, and its outcome closes or
+    re-opens the circuit."""
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if self.trial_running or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.trial_running = True
+        return True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def release(self):
+        # the trial call was abandoned (e.g. the client went away) without an outcome
+        self.trial_running = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_running or self.consecutive_failures >= self.failures:
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+
+class Route:
+    """One way of serving the call: a client (getter, so tests can swap it) and a model."""
+
+    def __init__(self, name, get_client, model):
+        self.name = name
+        self.get_client = get_client
+        self.model = model
+        self.breaker = CircuitBreaker()
+
+
+class LLMExecutor:
+    """Runs an LLM call under a deadline, with hedging, rate-limit retries,
+    a per-route circuit breaker and fallback to the next route.
+
+    ``make_call(client, model)`` returns the awaitable to run. On a route,
+    once a call has been outstanding for the hedge threshold a duplicate is
+    started and whichever finishes first wins. A route that fails, is
+    rate limited past its retries, or exceeds its attempt timeout hands
+    over to the next one; only the last route may use the whole remaining
+    deadline.
+    """
+
+    def __init__(self, routes, deadline=LLM_DEADLINE, attempt_timeout=LLM_ATTEMPT_TIMEOUT,
+                 hedge_after=LLM_HEDGE_AFTER, max_retries=LLM_MAX_RETRIES):
+        # imported here rather than per call: the first openai import takes a while
+        from openai import RateLimitError
+
+        self.rate_limit_error = RateLimitError
+        self.routes = routes
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self._latencies = deque(maxlen=200)
+
+    def hedge_threshold(self):
+        if self.hedge_after in ("off", None):
+            return None
+        if self.hedge_after != "auto":
+            return float(self.hedge_after) or None
+        if len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return DEFAULT_HEDGE_AFTER
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95)]
+
+    async def run(self, make_call, deadline=None):
+        """Return (result, name of the route that produced it)."""
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + (deadline or self.deadline)
+        error = None
+
+        for i, route in enumerate(self.routes):
+            # before allow(): on a half-open breaker it claims the trial call
+            remaining = expires - loop.time()
+            if remaining <= 0:
+                break
+            if not route.breaker.allow():
+                metrics.llm_requests.inc(route=route.name, outcome="breaker_open")
+                error = error or CircuitOpenError(f"circuit open for {route.name} ({route.model})")
+                continue
+            last = i == len(self.routes) - 1
+            try:
+                result = await asyncio.wait_for(
+                    self._with_retries(route, make_call),
+                    remaining if last else min(remaining, self.attempt_timeout)
+                )
+            except asyncio.CancelledError:
+                route.breaker.release()
+                raise
+            except Exception as e:
+                route.breaker.record_failure()
+                outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                metrics.llm_requests.inc(route=route.name, outcome=outcome)
+                error = e
+                continue
+
+            route.breaker.record_success()
+            metrics.llm_requests.inc(route=route.name, outcome="ok")
+            if i > 0:
+                metrics.llm_fallbacks.inc(route=route.name)
+            return result, route.name
+
+        if error is None or isinstance(error, asyncio.TimeoutError):
+            error = TimeoutError(f"LLM call exceeded its {deadline or self.deadline:g}s deadline")
+        raise error
+
+    async def _with_retries(self, route, make_call):
+        # exponential backoff with full jitter; honours Retry-After when the API sends one
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged(route, make_call)
+            except self.rate_limit_error as e:
+                if attempt == self.max_retries:
+                    raise
+                metrics.retries.inc(stage="llm", reason="rate_limit")
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = random.uniform(0, min(30, 2 ** attempt))
+                await asyncio.sleep(delay)
+
+    async def _hedged(self, route, make_call):
+        metrics.llm_attempts.inc(route=route.name, kind="first")
+        started = time.perf_counter()
+        first = asyncio.create_task(make_call(route.get_client(), route.model))
+        tasks = {first}
+        threshold = self.hedge_threshold()
+        try:
+            while True:
+                done, tasks = await asyncio.wait(tasks, timeout=threshold, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # the call is slower than usual: race a duplicate against it
+                    metrics.llm_attempts.inc(route=route.name, kind="hedge")
+                    tasks.add(asyncio.create_task(make_call(route.get_client(), route.model)))
+                    threshold = None
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            metrics.llm_hedge_wins.inc(route=route.name)
+                        if route is self.routes[0]:
+                            # time since the first call started, even when the hedge
+                            # won: recording the hedge's own time would pull the
+                            # threshold down and make hedging feed on itself
+                            self._latencies.append(time.perf_counter() - started)
+                        return task.result()
+                if not tasks:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def breaker_gauges(self):
+        return {
+            f"genai_llm_breaker_open_{route.name}": (f"1 while the {route.name} LLM circuit is open", int(route.breaker.is_open))
+            for route in self.routes
+        }
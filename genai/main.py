@@ -1,40 +1,142 @@
+import asyncio
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
 from typing_extensions import TypedDict
-from langgraph.graph import StateGraph, START, END
-from pydantic import BaseModel
-from system_prompt import scheduler_system_prompt,panchkarma_context
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from pydantic import BaseModel, TypeAdapter
+from prompt_builder import build_messages, prefix_tokens
+from schedule_stream import ScheduleStreamParser
+from schedule_cache import build_schedule_cache, cache_key
+from triage import consultation_schedule, prompt_hints, triage
+from llm_executor import LLMExecutor, Route, LLM_MODEL, LLM_FALLBACK_MODEL, LLM_FALLBACK_BASE_URL, LLM_FALLBACK_API_KEY
+import metrics
 import os
 
 
 load_dotenv()
 
+# The clients below, and the langchain / langgraph / qdrant imports behind
+# them, are built on first use (or by warm_up() from the server's lifespan
+# hook), so importing this module does no I/O and stays cheap. Assigning
+# one of these globals directly (as bench/load.py does) replaces it.
+http_client = None
+embedding_model = None
+vector_db = None
+client = None
+fallback_client = None
+executor = None
+_graph = None
+
+# one pooled keep-alive connection pool shared by the LLM and embedding clients
+def get_http_client():
+    global http_client
+    if http_client is None:
+        import httpx
+        from openai import DefaultAsyncHttpxClient
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "200")),
+                max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "50")),
+                keepalive_expiry=30
+            ),
+            timeout=httpx.Timeout(120, connect=10)
+        )
+    return http_client
+
 #vector embedding
-embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-small"
-)
+def get_embedding_model():
+    global embedding_model
+    if embedding_model is None:
+        from langchain_openai import OpenAIEmbeddings
+        from embedding_cache import CachedEmbeddings
 
-vector_db = QdrantVectorStore.from_existing_collection(
-    url="http://localhost:6333",
-    collection_name="panchkarma-new-data",
-    embedding=embedding_model
-)
+        embedding_model = CachedEmbeddings(OpenAIEmbeddings(
+            model="text-embedding-3-small",
+            http_async_client=get_http_client()
+        ))
+    return embedding_model
 
+# RETRIEVAL_BACKEND=numpy searches the mmapped index written by indexing.py
+# in-process instead of calling Qdrant. RETRIEVAL_HYBRID puts the BM25 index
+# in front ("auto": whenever indexing.py has written one).
+def build_retriever(backend=None, hybrid=None):
+    from lexical_index import HybridRetriever, LexicalIndex, INDEX_PATH as LEXICAL_INDEX_PATH
 
-# client = OpenAI()
+    backend = backend or os.getenv("RETRIEVAL_BACKEND", "qdrant")
+    if backend == "numpy":
+        from vector_index import NumpyVectorIndex
 
+        retriever = NumpyVectorIndex(embedding=get_embedding_model())
+    elif backend == "qdrant":
+        from retriever import QdrantRetriever
+
+        retriever = QdrantRetriever(embedding=get_embedding_model())
+    else:
+        raise ValueError(f"Unknown RETRIEVAL_BACKEND {backend!r}")
+
+    hybrid = hybrid or os.getenv("RETRIEVAL_HYBRID", "auto")
+    if hybrid == "1" or (hybrid == "auto" and LEXICAL_INDEX_PATH.exists()):
+        retriever = HybridRetriever(
+            retriever,
+            LexicalIndex.load(),
+            min_coverage=float(os.getenv("LEXICAL_MIN_COVERAGE", "0.8"))
+        )
+    return retriever
+
+def get_vector_db():
+    global vector_db
+    if vector_db is None:
+        vector_db = build_retriever()
+    return vector_db
 
-client = OpenAI(
-    api_key= os.getenv('GEMINI_API_KEY'),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+
+# client = AsyncOpenAI()
+
+
+def get_client():
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(
+            api_key= os.getenv('GEMINI_API_KEY'),
+            base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+            http_client=get_http_client()
+        )
+    return client
+
+def get_fallback_client():
+    global fallback_client
+    if not LLM_FALLBACK_BASE_URL:
+        return get_client()
+    if fallback_client is None:
+        from openai import AsyncOpenAI
+
+        fallback_client = AsyncOpenAI(
+            api_key=LLM_FALLBACK_API_KEY,
+            base_url=LLM_FALLBACK_BASE_URL,
+            http_client=get_http_client()
+        )
+    return fallback_client
+
+# deadline, hedging, rate-limit retries, circuit breaker and fallback for the
+# schedule call; see llm_executor.py for the LLM_* settings
+def get_executor():
+    global executor
+    if executor is None:
+        routes = [Route("primary", get_client, LLM_MODEL)]
+        if LLM_FALLBACK_MODEL:
+            routes.append(Route("fallback", get_fallback_client, LLM_FALLBACK_MODEL))
+        executor = LLMExecutor(routes)
+        metrics.register_collector(executor.breaker_gauges)
+    return executor
 
 
 class State(TypedDict):
     query : str
     schedule : list | None
+    usage : dict | None
+    triage : dict | None
 
 class DayPlan(BaseModel):
     day: int
@@ -45,63 +147,306 @@ class DayPlan(BaseModel):
 class ScheduleClassifier(BaseModel):
     schedule: list[DayPlan]
 
-def chat_node(state : State):
-    patient_symptoms = state["query"]
-    
+_schedule_adapter = TypeAdapter(list[DayPlan])
+
+schedule_cache = build_schedule_cache(
+    dumps=lambda schedule: _schedule_adapter.dump_json(schedule).decode(),
+    loads=_schedule_adapter.validate_json
+)
+
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+
+def record_usage(usage, prompt_info, response):
+    usage.update(prompt_info)
+    if response.usage is not None:
+        usage["prompt_tokens"] = response.usage.prompt_tokens
+        usage["completion_tokens"] = response.usage.completion_tokens
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        usage["cached_prompt_tokens"] = getattr(details, "cached_tokens", None) or 0
+
+def cached_usage():
+    return {"cached": True, "prompt_tokens": 0, "completion_tokens": 0}
+
+def triaged_usage():
+    return {"triaged": True, "prompt_tokens": 0, "completion_tokens": 0}
+
+def screen(patient_symptoms):
+    """Triage ``patient_symptoms``: (findings, consultation schedule or None)."""
+    with metrics.stage("triage"):
+        findings = triage(patient_symptoms)
+    metrics.triage_outcomes.inc(action=findings["action"])
+    if findings["action"] == "consult":
+        return findings, _schedule_adapter.validate_python(consultation_schedule(findings))
+    return findings, None
+
+async def retrieve(patient_symptoms, query_vector=None):
     # Perform vector search inside the function
-    search_results = vector_db.similarity_search(
-        query = patient_symptoms
-    )
-    
-    specific_information_with_respect_to_symptoms = "\n\n\n".join([f"Specific Content: {result.page_content} " for result in search_results])
+    with metrics.stage("retrieval"):
+        search_results = await get_vector_db().asimilarity_search(
+            query = patient_symptoms,
+            k = RETRIEVAL_K,
+            vector = query_vector
+        )
+    metrics.retrieved_documents.observe(len(search_results))
+    return search_results
+
+async def generate_schedule(patient_symptoms, query_vector=None, usage=None, hints=None):
+    search_results = await retrieve(patient_symptoms, query_vector)
+    return await complete_schedule(patient_symptoms, search_results, usage, hints)
+
+async def complete_schedule(patient_symptoms, search_results, usage=None, hints=None):
+    with metrics.stage("prompt_assembly"):
+        messages, prompt_info = build_messages(patient_symptoms, search_results, hints=hints)
+
+    # parse() validates against ScheduleClassifier itself, so this stage
+    # includes Pydantic validation; validation failures show up as its errors
+    with metrics.stage("llm"):
+        response, route = await get_executor().run(
+            lambda llm, model: llm.beta.chat.completions.parse(
+                model= model,
+                response_format=ScheduleClassifier,
+                messages= messages
+            )
+        )
+
+    if usage is None:
+        usage = {}
+    record_usage(usage, prompt_info, response)
+    usage["llm_route"] = route
+    metrics.record_tokens(usage)
+
+    return response.choices[0].message.parsed.schedule
+
+async def triage_node(state : State):
+    findings, schedule = screen(state["query"])
+    state["triage"] = findings
+    if schedule is not None:
+        state["schedule"] = schedule
+        state["usage"] = triaged_usage()
+    return state
 
-    SYSTEM_PROMPT = scheduler_system_prompt + f"""
-    <context>
-        general_information_about_panchkarma : {panchkarma_context}
-        specific_information_with_respect_to_symptoms : {specific_information_with_respect_to_symptoms}
-        patient_symptoms : {patient_symptoms}
-    </context>
+def route_after_triage(state : State):
+    # "consult" ends the graph with the consultation-first schedule
+    return state["triage"]["action"]
 
+async def chat_node(state : State):
+    patient_symptoms = state["query"]
+    hints = prompt_hints(state["triage"]) if state.get("triage") else None
+    # stays empty when the schedule came from the cache
+    usage = {}
+
+    if schedule_cache is None:
+        state["schedule"] = await generate_schedule(patient_symptoms, usage=usage, hints=hints)
+    else:
+        state["schedule"] = await schedule_cache.get_or_compute(
+            patient_symptoms,
+            lambda query_vector: generate_schedule(patient_symptoms, query_vector, usage=usage, hints=hints),
+            embed=get_embedding_model().aembed_query,
+            context=hints or ""
+        )
+
+    state["usage"] = usage or cached_usage()
+    return state
+
+async def stream_schedule(patient_symptoms):
+    """Yield ("day", DayPlan) as each day is generated, then ("done", summary).
+
+    Days are validated one by one as they arrive; the summary carries the
+    whole schedule validated against ScheduleClassifier, exactly as /chat
+    returns it.
     """
+    findings, schedule = screen(patient_symptoms)
+    if schedule is not None:
+        for day in schedule:
+            yield "day", day
+        yield "done", {"schedule": schedule, "usage": triaged_usage()}
+        return
+
+    hints = prompt_hints(findings)
+    if schedule_cache is not None:
+        cached = await schedule_cache.get(patient_symptoms, context=hints)
+        if cached is not None:
+            for day in cached:
+                yield "day", day
+            yield "done", {"schedule": cached, "usage": cached_usage()}
+            return
 
-    response = client.beta.chat.completions.parse(
-        model= "gemini-2.5-flash",
+    search_results = await retrieve(patient_symptoms)
+    with metrics.stage("prompt_assembly"):
+        messages, prompt_info = build_messages(patient_symptoms, search_results, hints=hints)
+    parser = ScheduleStreamParser()
+
+    started = time.perf_counter()
+    async with get_client().beta.chat.completions.stream(
+        model= LLM_MODEL,
         response_format=ScheduleClassifier,
-        messages= [
-            {"role" : "assistant", "content" : SYSTEM_PROMPT},
-            {"role" : "user", "content" : patient_symptoms}
-        ]
-    )
+        messages= messages,
+        stream_options={"include_usage": True}
+    ) as stream:
+        async for event in stream:
+            if event.type == "content.delta":
+                for day in parser.feed(event.delta):
+                    with metrics.stage("validation"):
+                        day = DayPlan.model_validate(day)
+                    if day.day == 1:
+                        metrics.stage_duration.observe(time.perf_counter() - started, stage="llm_first_day")
+                    yield "day", day
+        # not timed as "llm": the stream has been read, so this returns at once;
+        # streamed calls are covered by llm_first_day and llm_stream
+        response = await stream.get_final_completion()
+    metrics.stage_duration.observe(time.perf_counter() - started, stage="llm_stream")
 
-    state["schedule"] = response.choices[0].message.parsed.schedule
+    schedule = response.choices[0].message.parsed.schedule
+    usage = {}
+    record_usage(usage, prompt_info, response)
+    metrics.record_tokens(usage)
 
-    return state
+    if schedule_cache is not None:
+        await schedule_cache.set(patient_symptoms, schedule, context=hints)
+
+    yield "done", {"schedule": schedule, "usage": usage}
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+async def generate_schedules(queries, concurrency=None):
+    """Generate schedules for many patients at once.
+
+    Queries triaged to "consult" get the consultation-first schedule
+    directly. Queries with the same cache key (see schedule_cache.cache_key)
+    are computed once, cached ones are
+    answered without any call, the rest are retrieved together (one
+    batched embedding request, one batched vector search) and their LLM
+    calls fan out under ``concurrency``. Returns one result per query, in
+    order: {"query", "schedule", "usage"} or {"query", "error"}.
+    """
+    semaphore = asyncio.Semaphore(concurrency or BATCH_CONCURRENCY)
+
+    # the triage hints go into the prompt, so they are part of the key
+    triaged = {}
+    keys = {}
+    unique = {}
+    for query in queries:
+        findings, schedule = screen(query)
+        if schedule is not None:
+            triaged[query] = {"schedule": schedule, "usage": triaged_usage()}
+        else:
+            hints = prompt_hints(findings)
+            keys[query] = cache_key(query, hints)
+            unique.setdefault(keys[query], (query, hints))
+
+    results = {}
+    pending = []
+    for key, (query, hints) in unique.items():
+        cached = await schedule_cache.get(query, context=hints) if schedule_cache is not None else None
+        if cached is not None:
+            results[key] = {"schedule": cached, "usage": cached_usage()}
+        else:
+            pending.append((key, query, hints))
+
+    try:
+        with metrics.stage("batch_retrieval"):
+            documents = await get_vector_db().abatch_similarity_search([query for _, query, _ in pending], k=RETRIEVAL_K)
+    except Exception as e:
+        documents = [e] * len(pending)
+
+    async def run(key, query, hints, search_results):
+        if isinstance(search_results, Exception):
+            results[key] = {"error": f"retrieval failed: {search_results}"}
+            return
+        usage = {}
+        try:
+            async with semaphore:
+                schedule = await complete_schedule(query, search_results, usage, hints)
+        except Exception as e:
+            results[key] = {"error": f"{type(e).__name__}: {e}"}
+            return
+        if schedule_cache is not None:
+            await schedule_cache.set(query, schedule, context=hints)
+        results[key] = {"schedule": schedule, "usage": usage}
 
-graph_builder = StateGraph(State)
+    await asyncio.gather(*(run(key, query, hints, docs) for (key, query, hints), docs in zip(pending, documents)))
 
-graph_builder.add_node("chat_node", chat_node)
+    return [{"query": query, **(triaged.get(query) or results[keys[query]])} for query in queries]
 
-graph_builder.add_edge(START, "chat_node")
-graph_builder.add_edge("chat_node", END)
+def _cache_gauges():
+    gauges = {
+        f"genai_embedding_cache_{name}": (f"Embedding cache {name.replace('_', ' ')}", value)
+        for name, value in getattr(embedding_model, "stats", {}).items()
+    }
+    if schedule_cache is not None:
+        for name, value in schedule_cache.stats().items():
+            if isinstance(value, (int, float)):
+                gauges[f"genai_schedule_cache_{name}"] = (f"Schedule cache {name.replace('_', ' ')}", value)
+    return gauges
 
-graph = graph_builder.compile()
+metrics.register_collector(_cache_gauges)
 
-def main():
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "joint pain and stiffness")
+
+async def warm_up():
+    """Build every client and prime connections and caches before serving.
+
+    Runs one retrieval (embedding API, Qdrant or the mmapped index, the
+    lexical index), loads the tokenizer and compiles the graph. Raises if
+    retrieval fails. Opening the LLM connection is best effort: a
+    failure there is returned, not raised, since /chat may still work.
+    """
+    def build():
+        get_graph()
+        get_vector_db()
+        get_client()
+        get_executor()
+        prefix_tokens()
+
+    # imports and the tokenizer load are blocking; keep them off the event loop
+    await asyncio.to_thread(build)
+    await retrieve(WARMUP_QUERY)
+    try:
+        await get_client().models.list()
+    except Exception as e:
+        return {"llm": f"{type(e).__name__}: {e}"}
+    return {"llm": "ok"}
+
+async def aclose():
+    if vector_db is not None:
+        await vector_db.aclose()
+    if http_client is not None:
+        await http_client.aclose()
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        from langgraph.graph import StateGraph, START, END
+
+        graph_builder = StateGraph(State)
+
+        graph_builder.add_node("triage", metrics.node("triage", triage_node))
+        graph_builder.add_node("chat_node", metrics.node("chat_node", chat_node))
+
+        graph_builder.add_edge(START, "triage")
+        graph_builder.add_conditional_edges("triage", route_after_triage, {"consult": END, "continue": "chat_node"})
+        graph_builder.add_edge("chat_node", END)
+
+        _graph = graph_builder.compile()
+    return _graph
+
+def __getattr__(name):
+    # keeps `from main import graph` working while building it on first use
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def main():
     user_query = input("> ")
     
     _state = State(
         query=user_query
     )
 
-    result = graph.invoke(_state)
+    result = await get_graph().ainvoke(_state)
 
     print(result)
+    await aclose()
       
 
 if __name__ == "__main__":
-    main()
-
-
-
-
-
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+"""Per-stage timings, token counts and error counters in Prometheus text format.
+
+Deliberately dependency-free: a handful of counters and histograms kept
+in dicts, rendered by ``render()`` for GET /metrics. Set
+METRICS_ENABLED=0 to turn every call here into a no-op, and
+OTEL_ENABLED=1 to additionally open an OpenTelemetry span per stage
+(exported over OTLP/HTTP when OTEL_EXPORTER_OTLP_ENDPOINT is set).
+"""
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "off")
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "0") in ("1", "true", "on")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 6144, 8192, 16384, 32768)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32)
+
+_metrics = []
+_collectors = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _format_labels((*self.labelnames, "le"), (*key, bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def register_collector(collect):
+    """``collect()`` returns {metric name: (help, value)} gauges, read at scrape time."""
+    _collectors.append(collect)
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    for collect in _collectors:
+        for name, (help, value) in collect().items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+stage_duration = Histogram("genai_stage_duration_seconds", "Time spent per pipeline stage", ["stage"])
+stage_errors = Counter("genai_stage_errors_total", "Exceptions raised per pipeline stage", ["stage", "error"])
+http_duration = Histogram("genai_http_request_duration_seconds", "HTTP request latency", ["path", "status"])
+prompt_tokens = Histogram("genai_prompt_tokens", "Prompt tokens per LLM call", buckets=TOKEN_BUCKETS)
+tokens = Counter("genai_tokens_total", "LLM tokens by kind", ["kind"])
+retrieved_documents = Histogram("genai_retrieved_documents", "Documents returned per retrieval", buckets=COUNT_BUCKETS)
+retrieval_path = Counter("genai_retrieval_total", "Retrievals by path taken", ["path"])
+retries = Counter("genai_retries_total", "Retried upstream calls", ["stage", "reason"])
+triage_outcomes = Counter("genai_triage_total", "Triage decisions", ["action"])
+llm_requests = Counter("genai_llm_requests_total", "LLM executions per route by outcome", ["route", "outcome"])
+llm_attempts = Counter("genai_llm_attempts_total", "Upstream LLM calls started (first or hedge)", ["route", "kind"])
+llm_hedge_wins = Counter("genai_llm_hedge_wins_total", "Hedged calls that beat the original", ["route"])
+llm_fallbacks = Counter("genai_llm_fallbacks_total", "Requests served by a fallback route", ["route"])
+
+
+_tracer = None
+
+
+def _get_tracer():
+    global _tracer
+    if _tracer is None:
+        from opentelemetry import trace
+
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "ayursutra-genai")}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("genai")
+    return _tracer
+
+
+@contextmanager
+def _timed_stage(name):
+    span = _get_tracer().start_as_current_span(f"genai.{name}") if OTEL_ENABLED else nullcontext()
+    started = time.perf_counter()
+    with span:
+        try:
+            yield
+        except BaseException as e:
+            stage_errors.inc(stage=name, error=type(e).__name__)
+            raise
+        finally:
+            stage_duration.observe(time.perf_counter() - started, stage=name)
+
+
+_noop = nullcontext()
+
+
+def stage(name):
+    """Time a block as pipeline stage ``name`` (and trace it, if enabled)."""
+    if not ENABLED and not OTEL_ENABLED:
+        return _noop
+    return _timed_stage(name)
+
+
+def node(name, fn):
+    """Wrap an async LangGraph node so the whole node is recorded as a stage."""
+    async def instrumented(state):
+        with stage(f"node.{name}"):
+            return await fn(state)
+    instrumented.__name__ = getattr(fn, "__name__", name)
+    return instrumented
+
+
+def record_tokens(usage):
+    if not ENABLED or not usage:
+        return
+    if usage.get("prompt_tokens"):
+        prompt_tokens.observe(usage["prompt_tokens"])
+    for kind in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+        if usage.get(kind):
+            tokens.inc(usage[kind], kind=kind.removesuffix("_tokens"))
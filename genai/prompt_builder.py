@@ -0,0 +1,112 @@
+import os
+import re
+from functools import cache
+
+from system_prompt import scheduler_system_prompt, panchkarma_context
+
+
+# Everything that is identical for every request goes first, byte for byte,
+# so the provider's prompt cache can reuse it. Per-request content goes last.
+PROMPT_PREFIX = scheduler_system_prompt + f"""
+    <context>
+        general_information_about_panchkarma : {panchkarma_context}
+    </context>
+"""
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+MIN_PASSAGE_TOKENS = 48
+
+
+@cache
+def load_encoding():
+    # Gemini does not publish its tokenizer; o200k_base is a close enough
+    # estimate for budgeting. Fall back to ~4 chars/token when tiktoken
+    # cannot load its BPE file (e.g. offline). Loaded on first use, since
+    # the first load may download that file.
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(os.getenv("PROMPT_TOKENIZER", "o200k_base"))
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    encoding = load_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = load_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+@cache
+def prefix_tokens():
+    return count_tokens(PROMPT_PREFIX)
+
+
+def select_passages(documents, budget):
+    """Keep retrieved passages in relevance order until ``budget`` tokens are used.
+
+    Duplicates (same text up to whitespace/case) are dropped; the first
+    passage that does not fit is truncated if a useful amount of room is
+    left, and everything after it is discarded.
+    """
+    passages = []
+    seen = set()
+    used = 0
+    for document in documents:
+        text = document.page_content.strip()
+        key = re.sub(r"\s+", " ", text.lower())
+        if not text or key in seen:
+            continue
+        seen.add(key)
+
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining >= MIN_PASSAGE_TOKENS:
+                passages.append(truncate_tokens(text, remaining))
+                used = budget
+            break
+        passages.append(text)
+        used += tokens
+    return passages, used
+
+
+def build_messages(patient_symptoms, documents, budget=PROMPT_TOKEN_BUDGET, hints=None):
+    """Return (messages, prompt info) for the schedule LLM call.
+
+    ``budget`` bounds the whole input: whatever the fixed prefix and the
+    patient's text leave over is what retrieved passages may use.
+    ``hints`` (the triage result line) goes in the per-request part.
+    """
+    triage_notes = f"\n        triage_notes : {hints}" if hints else ""
+    symptom_tokens = count_tokens(patient_symptoms + triage_notes)
+    passage_budget = max(budget - prefix_tokens() - symptom_tokens, 0)
+    passages, passage_tokens = select_passages(documents, passage_budget)
+
+    specific_information_with_respect_to_symptoms = "\n\n\n".join(f"Specific Content: {passage}" for passage in passages)
+    request_content = f"""
+    <context>
+        specific_information_with_respect_to_symptoms : {specific_information_with_respect_to_symptoms}
+        patient_symptoms : {patient_symptoms}{triage_notes}
+    </context>
+    """
+
+    messages = [
+        {"role" : "system", "content" : PROMPT_PREFIX},
+        {"role" : "user", "content" : request_content}
+    ]
+    info = {
+        "estimated_prompt_tokens": prefix_tokens() + count_tokens(request_content),
+        "prefix_tokens": prefix_tokens(),
+        "passages": len(passages),
+        "passages_dropped": len(documents) - len(passages)
+    }
+    return messages, info
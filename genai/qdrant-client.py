@@ -1,8 +1,14 @@
+import sys
 from qdrant_client import QdrantClient
+from indexing import COLLECTION_NAME, MANIFEST_PATH, QDRANT_URL
 
-client = QdrantClient(url="http://localhost:6333")
+collection_name = sys.argv[1] if len(sys.argv) > 1 else COLLECTION_NAME
+
+client = QdrantClient(url=QDRANT_URL)
 try:
-    client.delete_collection("panchkarma-data")
+    client.delete_collection(collection_name)
+    # forget what was indexed so the next indexing.py run rebuilds everything
+    MANIFEST_PATH.unlink(missing_ok=True)
     print("Cleared existing collection")
 except:
     print("Collection didn't exist or couldn't be deleted")
@@ -0,0 +1,57 @@
+from langchain_core.documents import Document
+from qdrant_client import AsyncQdrantClient, models
+from indexing import COLLECTION_NAME, QDRANT_URL
+import metrics
+
+
+def _to_document(point):
+    payload = point.payload or {}
+    return Document(
+        page_content=payload.get("page_content", ""),
+        metadata=payload.get("metadata") or {}
+    )
+
+
+class QdrantRetriever:
+    """Async similarity search against the collection written by indexing.py.
+
+    Uses the same payload layout as langchain's QdrantVectorStore
+    ("page_content" / "metadata"), but talks to Qdrant through the async
+    client so a search never blocks the event loop.
+    """
+
+    def __init__(self, embedding, url=QDRANT_URL, collection_name=COLLECTION_NAME, client=None):
+        self.embedding = embedding
+        self.collection_name = collection_name
+        self.client = client or AsyncQdrantClient(location=url, timeout=10)
+
+    async def asimilarity_search_by_vector(self, vector, k=4):
+        with metrics.stage("vector_search"):
+            response = await self.client.query_points(
+                collection_name=self.collection_name,
+                query=vector,
+                limit=k,
+                with_payload=True
+            )
+        return [_to_document(point) for point in response.points]
+
+    async def asimilarity_search(self, query, k=4, vector=None):
+        if vector is None:
+            vector = await self.embedding.aembed_query(query)
+        return await self.asimilarity_search_by_vector(vector, k=k)
+
+    async def abatch_similarity_search(self, queries, k=4, vectors=None):
+        """One embedding request and one Qdrant round-trip for all queries."""
+        if not queries:
+            return []
+        if vectors is None:
+            vectors = await self.embedding.aembed_queries(queries)
+        with metrics.stage("vector_search"):
+            responses = await self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[models.QueryRequest(query=vector, limit=k, with_payload=True) for vector in vectors]
+            )
+        return [[_to_document(point) for point in response.points] for response in responses]
+
+    async def aclose(self):
+        await self.client.close()
@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import metrics
+
+
+BASE_DIR = Path(__file__).parent
+logger = logging.getLogger("uvicorn.error")
+
+STOPWORDS = {
+    "a", "an", "and", "or", "the", "of", "with", "in", "on", "for", "to", "from",
+    "is", "are", "am", "i", "my", "me", "have", "has", "had", "having", "since",
+    "also", "very", "some", "patient", "suffering"
+}
+
+
+# a negation applies to the rest of its clause: "no fever or headache"
+# negates both, "no fever and headache" only the fever
+CLAUSE_BREAK = re.compile(r"[.,;:!?]|\b(?:and|but|with|now)\b")
+NEGATIONS = {"no", "not", "without", "never", "nor", "none", "denies", "denied"}
+
+
+def _normalize_clause(clause):
+    tokens = []
+    negated = False
+    for token in re.findall(r"[a-z0-9]+", clause):
+        if token in NEGATIONS:
+            negated = True
+        elif token not in STOPWORDS:
+            tokens.append(f"no-{token}" if negated else token)
+    return " ".join(tokens)
+
+
+def normalize_query(query):
+    """Clause-order- and punctuation-insensitive form of a symptom description.
+
+    Each clause keeps its word order and the clauses are sorted, so
+    "sciatica, constipation" and "constipation and sciatica" share a key
+    while "severe back pain, mild headache" and "mild back pain, severe
+    headache" do not. Negated terms are folded into "no-" tokens, so
+    "fever, no headache" and "headache, no fever" stay different too.
+    """
+    clauses = {_normalize_clause(clause) for clause in CLAUSE_BREAK.split(query.lower())}
+    return "; ".join(sorted(clauses - {""}))
+
+
+def cache_key(query, context=""):
+    """``context`` is anything besides the query the result depends on
+    (e.g. the triage hints put into the prompt)."""
+    key = normalize_query(query)
+    return f"{key} | {context}" if context else key
+
+
+def _scope(key):
+    # semantic reuse only between keys with the same context and negations
+    terms, _, context = key.partition(" | ")
+    return context, frozenset(token for token in re.split(r"[;\s]+", terms) if token.startswith("no-"))
+
+
+def source_files():
+    # everything a cached schedule was derived from: the prompt and the indexed data.
+    # The indexer's manifest changes exactly when the collection does; without one
+    # fall back to the CSVs the collection is built from.
+    from indexing import MANIFEST_PATH
+
+    data = [MANIFEST_PATH] if MANIFEST_PATH.exists() else sorted(BASE_DIR.glob("data*.csv"))
+    return [BASE_DIR / "system_prompt.py", *data]
+
+
+def fingerprint(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.name.encode())
+        if path.exists():
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    async def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Shared cache for multi-worker deployments.
+
+    Keys carry the cache version, so a prompt or data change simply stops
+    reading the old entries and Redis expires them through the TTL.
+    """
+
+    def __init__(self, url, ttl=None, namespace="schedule-cache", timeout=None):
+        import redis.asyncio as redis
+
+        # a slow Redis must not hold up the request: time out and treat it as a miss
+        self.redis = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.ttl = ttl
+        self.namespace = namespace
+        self.version = ""
+
+    def _key(self, key):
+        return f"{self.namespace}:{self.version}:{key}"
+
+    async def get(self, key):
+        value = await self.redis.get(self._key(key))
+        return value.decode() if value is not None else None
+
+    async def set(self, key, value):
+        await self.redis.set(self._key(key), value, ex=int(self.ttl) if self.ttl else None)
+
+    async def clear(self):
+        # old versions are left to expire; nothing to do eagerly
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class ScheduleCache:
+    """Result cache for generated schedules.
+
+    Lookups go exact (normalized query) first, then - if a similarity
+    threshold is configured - to the closest previously seen query
+    embedding. Concurrent misses for the same key share a single
+    computation. Values are stored as strings via ``dumps``/``loads`` so
+    every backend holds the same representation. A failing backend is
+    logged and counted; reads then miss and writes are skipped.
+    """
+
+    def __init__(self, backend, dumps, loads, similarity_threshold=None,
+                 max_vectors=1024, watch=source_files, check_interval=2.0):
+        self.backend = backend
+        self.dumps = dumps
+        self.loads = loads
+        self.similarity_threshold = similarity_threshold
+        self.max_vectors = max_vectors
+        self.watch = watch
+        self.check_interval = check_interval
+
+        self._vectors = OrderedDict()
+        self._inflight = {}
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "errors": 0}
+        self._stat_signature = None
+        self._checked_at = 0.0
+        self._pending_clear = False
+        self.version = None
+        self._check_version()
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        paths = self.watch()
+        signature = tuple((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in paths if p.exists())
+        if signature == self._stat_signature:
+            return
+        self._stat_signature = signature
+
+        version = fingerprint(paths)
+        if version != self.version:
+            if self.version is not None:
+                self._stats["invalidations"] += 1
+                self._vectors.clear()
+                self._pending_clear = True
+            self.version = version
+            if hasattr(self.backend, "version"):
+                self.backend.version = version
+
+    async def _maybe_clear(self):
+        self._check_version()
+        if self._pending_clear:
+            self._pending_clear = False
+            try:
+                await self.backend.clear()
+            except Exception as e:
+                self._backend_failed("clear", e)
+
+    def _backend_failed(self, operation, error):
+        self._stats["errors"] += 1
+        metrics.stage_errors.inc(stage="schedule_cache", error=type(error).__name__)
+        logger.warning("Schedule cache %s failed: %r", operation, error)
+
+    async def _backend_get(self, key):
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self._backend_failed("get", e)
+            return None
+
+    async def _backend_set(self, key, value):
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            self._backend_failed("set", e)
+
+    def _nearest(self, vector, scope):
+        keys = [k for k in self._vectors if _scope(k) == scope]
+        if not keys:
+            return None
+        matrix = np.stack([self._vectors[k] for k in keys])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return keys[best]
+        return None
+
+    def _remember_vector(self, key, vector):
+        self._vectors[key] = vector
+        self._vectors.move_to_end(key)
+        while len(self._vectors) > self.max_vectors:
+            self._vectors.popitem(last=False)
+
+    async def get_or_compute(self, query, compute, embed=None, context=""):
+        """Return the cached value for ``query`` or ``await compute(vector)``.
+
+        ``embed`` is only called on an exact miss when semantic matching is
+        enabled; the resulting vector is passed on to ``compute`` so the
+        caller does not embed the query a second time. ``context`` is
+        part of the key, see ``cache_key``.
+        """
+        await self._maybe_clear()
+        key = cache_key(query, context)
+
+        cached = await self._backend_get(key)
+        if cached is not None:
+            self._stats["hits"] += 1
+            return self.loads(cached)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._fill(key, query, compute, embed))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield so a disconnecting caller does not cancel the shared computation
+        return self.loads(await asyncio.shield(task))
+
+    async def get(self, query, context=""):
+        """Exact lookup only; for callers that produce the value themselves."""
+        await self._maybe_clear()
+        cached = await self._backend_get(cache_key(query, context))
+        if cached is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return self.loads(cached)
+
+    async def set(self, query, value, context=""):
+        await self._backend_set(cache_key(query, context), self.dumps(value))
+
+    async def _fill(self, key, query, compute, embed):
+        version = self.version
+        vector = unit = None
+        if self.similarity_threshold is not None and embed is not None:
+            vector = await embed(query)
+            unit = np.asarray(vector, dtype=np.float32)
+            unit /= np.linalg.norm(unit) or 1.0
+            similar = self._nearest(unit, _scope(key))
+            if similar is not None:
+                cached = await self._backend_get(similar)
+                if cached is not None:
+                    self._stats["semantic_hits"] += 1
+                    return cached
+
+        self._stats["misses"] += 1
+        value = self.dumps(await compute(vector))
+        # do not store results computed against data that changed meanwhile
+        if version == self.version:
+            await self._backend_set(key, value)
+            if unit is not None:
+                self._remember_vector(key, unit)
+        return value
+
+    def stats(self):
+        lookups = self._stats["hits"] + self._stats["semantic_hits"] + self._stats["misses"]
+        hits = self._stats["hits"] + self._stats["semantic_hits"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "size": len(self.backend),
+            "inflight": len(self._inflight),
+            "version": self.version
+        }
+
+
+def build_schedule_cache(dumps, loads):
+    """Configure the cache from the environment; returns None when disabled."""
+    kind = os.getenv("SCHEDULE_CACHE_BACKEND", "memory").lower()
+    if kind in ("", "off", "none", "0"):
+        return None
+
+    ttl = float(os.getenv("SCHEDULE_CACHE_TTL", "86400")) or None
+    if kind == "redis":
+        backend = RedisBackend(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            ttl=ttl,
+            timeout=float(os.getenv("SCHEDULE_CACHE_TIMEOUT", "0.5"))
+        )
+    else:
+        backend = MemoryBackend(maxsize=int(os.getenv("SCHEDULE_CACHE_SIZE", "1024")), ttl=ttl)
+
+    threshold = os.getenv("SCHEDULE_CACHE_SIMILARITY")
+    return ScheduleCache(
+        backend,
+        dumps=dumps,
+        loads=loads,
+        similarity_threshold=float(threshold) if threshold else None
+    )
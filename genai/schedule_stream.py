@@ -0,0 +1,53 @@
+import json
+
+
+class ScheduleStreamParser:
+    """Incrementally pulls complete day objects out of a streamed schedule.
+
+    The model emits ``{"schedule": [{...}, {...}, ...]}``. ``feed`` takes
+    raw text deltas and returns the day objects (as dicts) whose closing
+    brace has just arrived. Only brackets outside of JSON strings count,
+    so braces inside plan text do not confuse it.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.day_start = None
+        self._text = ""
+
+    def feed(self, delta):
+        days = []
+        offset = len(self._text)
+        self._text += delta
+        for i, char in enumerate(delta, start=offset):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                # depth 1: top-level object, 2: schedule array, 3: a day object
+                if char == "{" and self.depth == 3:
+                    self.day_start = i
+            elif char in "}]":
+                if char == "}" and self.depth == 3 and self.day_start is not None:
+                    days.append(json.loads(self._text[self.day_start:i + 1]))
+                    self.day_start = None
+                self.depth -= 1
+
+        if self.day_start is None:
+            # nothing pending, no need to keep the text around
+            self._text = ""
+        else:
+            self._text = self._text[self.day_start:]
+            self.day_start = 0
+        return days
@@ -1,12 +1,80 @@
-from fastapi import FastAPI
+import sys
+import time
+
+# `python server.py --workers N` spawns workers that first re-run this file
+# as __mp_main__ (importing everything) before importing it as "server"
+IMPORT_STARTED = getattr(sys.modules.get("__mp_main__"), "IMPORT_STARTED", time.perf_counter())
+
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+import os
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import uvicorn
+from pydantic import BaseModel, Field
+
+import metrics
 
 # Import your graph & State from your existing file
-from main import graph, State
+from main import get_graph, State, aclose, warm_up, schedule_cache, stream_schedule, generate_schedules
+
+
+logger = logging.getLogger("uvicorn.error")
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") not in ("0", "false", "off")
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+PROBE_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+startup = {
+    "ready": False,
+    "error": None,
+    "import_seconds": None,
+    "warmup_seconds": None,
+    "first_request_seconds": None
+}
 
-app = FastAPI()
+async def keep_warming(first_attempt: asyncio.Event):
+    # retried until it succeeds, so a Qdrant outage at boot delays readiness
+    # instead of crashing the worker
+    started = time.perf_counter()
+    while True:
+        try:
+            result = await asyncio.wait_for(warm_up(), WARMUP_TIMEOUT)
+            break
+        except TimeoutError:
+            startup["error"] = f"timed out after {WARMUP_TIMEOUT:g}s"
+        except Exception as e:
+            startup["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            first_attempt.set()
+        logger.warning("Warm-up failed (%s), retrying in %gs", startup["error"], WARMUP_RETRY_INTERVAL)
+        await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+
+    startup.update(ready=True, error=None, warmup_seconds=time.perf_counter() - started)
+    logger.info("Warm-up done in %.3fs (llm connection: %s)", startup["warmup_seconds"], result["llm"])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Imported server in %.3fs", startup["import_seconds"])
+    task = None
+    if WARMUP_ENABLED:
+        # start serving once the first attempt is over, successful or not
+        first_attempt = asyncio.Event()
+        task = asyncio.create_task(keep_warming(first_attempt))
+        await first_attempt.wait()
+    else:
+        startup["ready"] = True
+    yield
+    if task is not None:
+        task.cancel()
+    # release pooled http / qdrant connections
+    await aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS for React frontend
 app.add_middleware(
@@ -17,22 +85,108 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    # label by route template, not raw URL, to keep cardinality bounded
+    path = getattr(request.scope.get("route"), "path", "unmatched")
+    if startup["first_request_seconds"] is None and path not in PROBE_PATHS:
+        startup["first_request_seconds"] = elapsed
+        logger.info("First request (%s) took %.3fs", path, elapsed)
+    metrics.http_duration.observe(elapsed, path=path, status=response.status_code)
+    return response
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _startup_gauges():
+    gauges = {"genai_ready": ("1 once warm-up has succeeded", int(startup["ready"]))}
+    for name in ("import_seconds", "warmup_seconds", "first_request_seconds"):
+        if startup[name] is not None:
+            gauges[f"genai_startup_{name}"] = (f"Startup {name.replace('_', ' ')}", startup[name])
+    return gauges
+
+metrics.register_collector(_startup_gauges)
+
+# liveness: the process is up and serving
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# readiness: clients are built and retrieval answered once
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(
+        {"status": "ready" if startup["ready"] else "starting", **startup},
+        status_code=200 if startup["ready"] else 503
+    )
+
 # Request schema
 class Query(BaseModel):
     message: str
 
 @app.post("/chat")
-def chat(query: Query):
-    _state: State = {"query": query.message, "schedule": None}
-    result = graph.invoke(_state)
+async def chat(query: Query):
+    _state: State = {"query": query.message, "schedule": None, "usage": None, "triage": None}
+    result = await get_graph().ainvoke(_state)
+
+    return {"schedule": result["schedule"], "usage": result["usage"], "triage": result["triage"]}
+
+class BatchQuery(BaseModel):
+    messages: list[str] = Field(min_length=1, max_length=100)
+    concurrency: int | None = Field(default=None, ge=1, le=32)
+
+@app.post("/chat/batch")
+async def chat_batch(query: BatchQuery):
+    # one result per message, in order; a failed item carries "error" instead of "schedule"
+    return {"results": await generate_schedules(query.messages, concurrency=query.concurrency)}
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
 
-    return {"schedule": result["schedule"]}
+@app.post("/chat/stream")
+async def chat_stream(query: Query):
+    # Server-Sent Events: one "day" event per validated DayPlan as soon as the
+    # model has finished writing it, then "done" with the full schedule
+    async def events():
+        try:
+            async for event, data in stream_schedule(query.message):
+                yield sse(event, data)
+        except Exception as e:
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    if schedule_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **schedule_cache.stats()}
+
+startup["import_seconds"] = time.perf_counter() - IMPORT_STARTED
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
+
+    parser = argparse.ArgumentParser(description="AyurSutra genai API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--reload", action="store_true", help="auto-reload on code changes (dev only, single worker)")
+    args = parser.parse_args()
+
     uvicorn.run(
         "server:app",   # "server" = filename without .py, "app" = FastAPI instance
-        host="0.0.0.0",
-        port=8000,
-        reload=True      # auto-reload on code changes (dev only)
+        host=args.host,
+        port=args.port,
+        workers=1 if args.reload else args.workers,
+        reload=args.reload
     )
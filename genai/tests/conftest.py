@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the service modules are flat files in genai/, imported by name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from llm_executor import CircuitBreaker, CircuitOpenError, LLMExecutor, Route
+
+
+def fake_call(delays, log):
+    """make_call whose n-th call on a model sleeps ``delays[model][n]``;
+    an exception instance is raised instead."""
+    async def make_call(client, model):
+        n = sum(1 for m in log if m == model)
+        log.append(model)
+        delay = delays[model][min(n, len(delays[model]) - 1)]
+        if isinstance(delay, Exception):
+            raise delay
+        await asyncio.sleep(delay)
+        return f"{model}#{n}"
+    return make_call
+
+
+def make_executor(**kwargs):
+    routes = [Route("primary", lambda: None, "main"), Route("fallback", lambda: None, "backup")]
+    kwargs.setdefault("hedge_after", "off")
+    return LLMExecutor(routes, **kwargs)
+
+
+def rate_limited():
+    request = httpx.Request("POST", "http://llm")
+    response = httpx.Response(429, headers={"retry-after": "0"}, request=request)
+    return openai.RateLimitError("slow down", response=response, body=None)
+
+
+def test_primary_success():
+    log = []
+    executor = make_executor()
+    result = asyncio.run(executor.run(fake_call({"main": [0], "backup": [0]}, log)))
+    assert result == ("main#0", "primary")
+    assert log == ["main"]
+
+
+def test_hedge_wins_over_slow_first_call():
+    log = []
+    executor = make_executor(hedge_after=0.02)
+    result = asyncio.run(executor.run(fake_call({"main": [1.0, 0], "backup": [0]}, log)))
+    assert result == ("main#1", "primary")
+    assert log == ["main", "main"]
+
+
+def test_falls_back_on_error_and_timeout():
+    executor = make_executor()
+    log = []
+    assert asyncio.run(executor.run(fake_call({"main": [ValueError("boom")], "backup": [0]}, log))) \
+        == ("backup#0", "fallback")
+
+    executor = make_executor(deadline=1.0, attempt_timeout=0.05)
+    log = []
+    assert asyncio.run(executor.run(fake_call({"main": [5.0], "backup": [0]}, log))) == ("backup#0", "fallback")
+
+
+def test_rate_limit_is_retried_on_the_same_route():
+    log = []
+    executor = make_executor(max_retries=2)
+    result = asyncio.run(executor.run(fake_call({"main": [rate_limited(), 0], "backup": [0]}, log)))
+    assert result == ("main#1", "primary")
+
+
+def test_breaker_opens_and_skips_the_route():
+    executor = make_executor()
+    executor.routes[0].breaker = CircuitBreaker(failures=2, cooldown=60)
+    log = []
+    make_call = fake_call({"main": [ValueError("boom")], "backup": [0]}, log)
+    for n in range(3):
+        assert asyncio.run(executor.run(make_call)) == (f"backup#{n}", "fallback")
+    assert log.count("main") == 2
+    assert executor.routes[0].breaker.is_open
+
+
+def test_all_routes_open_raises_circuit_open():
+    executor = make_executor()
+    for route in executor.routes:
+        route.breaker = CircuitBreaker(failures=1, cooldown=60)
+        route.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(executor.run(fake_call({"main": [0], "backup": [0]}, [])))
+
+
+def test_half_open_trial_is_not_leaked_when_the_deadline_is_spent():
+    # the primary may use the whole deadline, so the fallback is never reached
+    executor = make_executor(deadline=0.05, attempt_timeout=1.0)
+    fallback = executor.routes[1].breaker = CircuitBreaker(failures=1, cooldown=0)
+    fallback.record_failure()
+    with pytest.raises(TimeoutError):
+        asyncio.run(executor.run(fake_call({"main": [5.0], "backup": [0]}, [])))
+    assert not fallback.trial_running
+    # the fallback's trial call is still available
+    assert fallback.allow()
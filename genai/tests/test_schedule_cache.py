@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from schedule_cache import MemoryBackend, ScheduleCache, cache_key, normalize_query
+
+
+class BrokenBackend(MemoryBackend):
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, value):
+        raise TimeoutError("redis timed out")
+
+
+def make_cache(backend):
+    return ScheduleCache(backend, dumps=str, loads=str, watch=lambda: [])
+
+
+def test_backend_errors_degrade_to_misses():
+    cache = make_cache(BrokenBackend())
+    calls = []
+
+    async def compute(vector):
+        calls.append(vector)
+        return "schedule"
+
+    async def run():
+        assert await cache.get_or_compute("sciatica", compute) == "schedule"
+        assert await cache.get_or_compute("sciatica", compute) == "schedule"
+        assert await cache.get("sciatica") is None
+        await cache.set("sciatica", "schedule")
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert len(calls) == 2
+    assert stats["misses"] == 3
+    assert stats["errors"] == 6
+
+
+def test_memory_backend_round_trip():
+    cache = make_cache(MemoryBackend())
+
+    async def run():
+        await cache.set("sciatica", "schedule", context="cautions: none")
+        assert await cache.get("sciatica", context="cautions: none") == "schedule"
+        assert await cache.get("sciatica") is None
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("first, second", [
+    ("sciatica, constipation", "constipation and sciatica"),
+    ("Sciatica; constipation!", "constipation, sciatica"),
+    ("I have chronic back pain", "chronic back pain"),
+    ("no fever or headache", "No fever or headache."),
+])
+def test_same_key(first, second):
+    assert normalize_query(first) == normalize_query(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("severe back pain, mild headache", "mild back pain, severe headache"),
+    ("left knee pain and right hip stiffness", "right knee pain and left hip stiffness"),
+    ("fever, no headache", "headache, no fever"),
+    ("no fever and headache", "no fever or headache"),
+    ("joint pain", "no joint pain"),
+])
+def test_different_keys(first, second):
+    assert normalize_query(first) != normalize_query(second)
+
+
+def test_cache_key_includes_context():
+    assert cache_key("sciatica") == "sciatica"
+    assert cache_key("sciatica", "cautions: elderly") != cache_key("sciatica", "cautions: none")
+
+
+def test_semantic_reuse_respects_negations_and_context():
+    cache = ScheduleCache(MemoryBackend(), dumps=str, loads=str, similarity_threshold=0.5, watch=lambda: [])
+
+    async def embed(query):
+        # every query looks the same to the embedding: only the key scope keeps them apart
+        return [1.0, 0.0]
+
+    def compute(value):
+        async def run(vector):
+            return value
+        return run
+
+    async def run():
+        assert await cache.get_or_compute("fever, no headache", compute("A"), embed, context="x") == "A"
+        assert await cache.get_or_compute("headache, no fever", compute("B"), embed, context="x") == "B"
+        assert await cache.get_or_compute("fever, no headache", compute("C"), embed, context="y") == "C"
+        assert await cache.get_or_compute("fevers, no headache", compute("D"), embed, context="x") == "A"
+
+    asyncio.run(run())
+    assert cache.stats()["semantic_hits"] == 1
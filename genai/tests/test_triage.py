@@ -0,0 +1,52 @@
+import pytest
+
+from triage import consultation_schedule, prompt_hints, triage
+
+
+@pytest.mark.parametrize("query, red_flags, contraindications, cautions", [
+    # negated
+    ("no fever or chest pain", [], [], []),
+    ("not pregnant", [], [], []),
+    ("denies chest pain", [], [], []),
+    ("denies any chest pain or fainting", [], [], []),
+    ("neither fever nor angina", [], [], []),
+    ("no fever, chest pain or syncope, only joint stiffness", [], [], []),
+    ("joint pain, no fever", [], [], []),
+    # not negated: the negation does not reach the term
+    ("no appetite and chest pain", ["chest pain"], [], []),
+    ("not hungry and have angina", ["chest pain"], [], []),
+    ("I am not sleeping well and pregnant", [], ["pregnancy"], []),
+    ("back pain without relief and now chest pain", ["chest pain"], [], []),
+    ("no fever but chest pain", ["chest pain"], [], []),
+    ("no fever with chest pain", ["chest pain"], [], []),
+    ("chest pain, no fever", ["chest pain"], [], []),
+    ("not pregnant, has a fever", [], [], ["active febrile or infectious illness"]),
+    ("no fever, pregnant", [], ["pregnancy"], []),
+    ("no fever, chest pain since yesterday", ["chest pain"], [], []),
+    ("joint pain, no fever, chest pain for two days", ["chest pain"], [], []),
+    ("no fever or chest pain, pregnant", [], ["pregnancy"], []),
+    # no negation
+    ("fever and fainted twice", ["syncope"], [], ["active febrile or infectious illness"]),
+    ("recently had surgery, on warfarin", [], ["recent major surgery"], ["blood thinners"]),
+    ("chronic constipation and bloating", [], [], []),
+    ("children", [], [], ["children"]),
+    ("my child has a fever", [], [], ["children", "active febrile or infectious illness"]),
+])
+def test_triage_findings(query, red_flags, contraindications, cautions):
+    findings = triage(query)
+    assert findings["red_flags"] == red_flags
+    assert findings["contraindications"] == contraindications
+    assert findings["cautions"] == cautions
+    assert findings["action"] == ("consult" if red_flags or contraindications else "continue")
+
+
+def test_consultation_schedule_lists_findings():
+    schedule = consultation_schedule(triage("pregnant with chest pain"))
+    assert len(schedule) == 1 and schedule[0]["doctor_consultation"] == "yes"
+    assert any("chest pain" in item for item in schedule[0]["plan"])
+    assert any("pregnancy" in item for item in schedule[0]["plan"])
+
+
+def test_prompt_hints():
+    assert prompt_hints(triage("sciatica")).endswith("cautions: none")
+    assert prompt_hints(triage("sciatica, on warfarin")).endswith("cautions: blood thinners")
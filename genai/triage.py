@@ -0,0 +1,141 @@
+import re
+
+
+# Terms follow panchkarma_context in system_prompt.py: the red-flag list
+# (section 5) and the contraindications (sections 4 and 8). Red flags and
+# absolute contraindications end the request with a consultation-first
+# schedule; cautions are passed on to the LLM as hints. The Contraindications
+# column of data1.csv/data4.csv is not used: its values are shifted from
+# neighbouring columns (symptoms, doshas, therapy names).
+RED_FLAGS = {
+    "chest pain": [r"chest (?:pain|pressure)", r"pain in (?:my |the )?chest", r"angina"],
+    "syncope": [r"syncope", r"faint(?:ed|ing|s)?", r"passed out", r"blacked out", r"loss of consciousness", r"unconscious"],
+    "severe breathlessness": [
+        r"severe (?:breathlessness|shortness of breath|difficulty breathing)",
+        r"(?:can ?not|can'?t|unable to|struggling to) breathe",
+        r"gasping for (?:air|breath)"
+    ],
+    "uncontrolled bleeding": [
+        r"uncontrolled bleeding",
+        r"(?:heavy|severe|profuse|non-?stop) bleeding",
+        r"bleeding (?:that )?(?:won'?t|will not|does not|doesn'?t) stop",
+        r"(?:vomiting|coughing up|spitting) blood"
+    ],
+    "sudden neurological changes": [
+        r"sudden(?:ly)? (?:weakness|numbness|confusion|paralysis|vision loss|loss of vision|slurred speech)",
+        r"slurred speech",
+        r"face (?:is )?drooping"
+    ]
+}
+
+CONTRAINDICATIONS = {
+    "pregnancy": [r"pregnan(?:t|cy)", r"expecting a baby", r"(?:first|second|third) trimester"],
+    "uncontrolled cardiovascular instability": [
+        r"heart attack", r"myocardial infarction", r"heart failure", r"unstable angina",
+        r"uncontrolled (?:blood pressure|hypertension|bp)"
+    ],
+    "acute serious renal failure": [r"(?:kidney|renal) failure", r"on dialysis"],
+    "uncontrolled bleeding disorders": [r"ha?emophilia", r"bleeding disorder"],
+    "acute psychosis": [r"psychosis", r"psychotic", r"hallucinat(?:ion|ions|ing)"],
+    "recent major surgery": [r"(?:recent|recently had|just had|underwent) (?:a |an )?(?:major )?(?:surgery|operation)", r"post-?operative"]
+}
+
+CAUTIONS = {
+    "active febrile or infectious illness": [r"fever", r"febrile", r"infection"],
+    "severe anemia": [r"ana?emi[ac]"],
+    "severe cachexia": [r"cachexi[ac]", r"(?:severe|rapid|unexplained) weight loss"],
+    "advanced frailty": [r"frail(?:ty)?", r"bed-?ridden"],
+    "elderly": [r"elderly", r"(?:[7-9]\d|1[01]\d)[- ]?(?:years?|yrs?)[- ]?old"],
+    "children": [r"child(?:ren)?", r"toddler", r"infant", r"(?:[1-9]|1[0-5])[- ]?(?:years?|yrs?)[- ]?old"],
+    "breastfeeding": [r"breast-?feeding", r"lactating", r"nursing mother"],
+    "blood thinners": [r"blood thinners?", r"anticoagulants?", r"warfarin"]
+}
+
+_CATEGORIES = {"red_flags": RED_FLAGS, "contraindications": CONTRAINDICATIONS, "cautions": CAUTIONS}
+
+# one alternation for every term, so a query is scanned once; the named
+# group that matched says which concept it was
+_GROUPS = {}
+_alternatives = []
+for category, concepts in _CATEGORIES.items():
+    for concept, patterns in concepts.items():
+        group = f"g{len(_GROUPS)}"
+        _GROUPS[group] = (category, concept)
+        _alternatives.append(f"(?P<{group}>{'|'.join(patterns)})")
+PATTERN = re.compile(r"\b(?:" + "|".join(_alternatives) + r")\b", re.IGNORECASE)
+
+# "not pregnant", "no fever or chest pain", "denies fever, syncope nor angina":
+# a negation covers the term right after it and carries on only across
+# terms joined by "or"/"nor", or a comma list that ends in "or"/"nor".
+# "no fever, pregnant" negates fever alone, and any other word ("and",
+# "with", "now", "have", "appetite", ...) ends the negation: when in
+# doubt, the term is flagged.
+NEGATION = re.compile(r"\b(?:no|not|never|neither|without|denies|denied|none)\b", re.IGNORECASE)
+NEGATION_LEAD = re.compile(r"(?:\s+(?:any|a|an)\b)?\s*", re.IGNORECASE)
+LIST_SEPARATOR = re.compile(r"\s*(?P<comma>,)?\s*(?:(?P<alternative>\b(?:or|nor)\b)\s*)?", re.IGNORECASE)
+
+REVIEW_ITEM = "Physician/Ayurvedic doctor review and approval required."
+
+
+def _negated_terms(text, matches):
+    """Indexes into ``matches`` of the terms covered by a negation."""
+    negated = set()
+    for negation in NEGATION.finditer(text):
+        first = next((i for i, match in enumerate(matches) if match.start() >= negation.end()), None)
+        if first is None or not NEGATION_LEAD.fullmatch(text, negation.end(), matches[first].start()):
+            continue
+        # how each following term is joined to the previous one: True for or/nor, False for a bare comma
+        joins = []
+        for previous, match in zip(matches[first:], matches[first + 1:]):
+            separator = LIST_SEPARATOR.fullmatch(text, previous.end(), match.start())
+            if separator is None or not (separator["comma"] or separator["alternative"]):
+                break
+            joins.append(separator["alternative"] is not None)
+        negated.add(first)
+        for i in range(len(joins)):
+            if not any(joins[i:]):
+                break
+            negated.add(first + i + 1)
+    return negated
+
+
+def triage(query):
+    """Screen ``query`` for red flags, absolute contraindications and cautions.
+
+    Returns {"action", "red_flags", "contraindications", "cautions"};
+    action is "consult" when the request must not go on to a generated
+    therapy schedule, else "continue".
+    """
+    findings = {category: [] for category in _CATEGORIES}
+    matches = list(PATTERN.finditer(query))
+    negated = _negated_terms(query, matches)
+    for i, match in enumerate(matches):
+        if i in negated:
+            continue
+        category, concept = _GROUPS[match.lastgroup]
+        if concept not in findings[category]:
+            findings[category].append(concept)
+
+    consult = findings["red_flags"] or findings["contraindications"]
+    return {"action": "consult" if consult else "continue", **findings}
+
+
+def consultation_schedule(findings):
+    """The deterministic consultation-first schedule for a "consult" triage."""
+    plan = []
+    if findings["red_flags"]:
+        plan.append(f"Seek emergency care: red-flag symptoms reported ({', '.join(findings['red_flags'])}).")
+    plan.append("Immediate physician assessment; do not start any Panchakarma procedure until medically cleared.")
+    if findings["contraindications"]:
+        plan.append(
+            f"Full Panchakarma procedures are contraindicated ({', '.join(findings['contraindications'])}); "
+            "supportive or modified care only under experienced clinical supervision."
+        )
+    plan.append(REVIEW_ITEM)
+    return [{"day": 1, "doctor_consultation": "yes", "plan": plan, "therapist_name": None}]
+
+
+def prompt_hints(findings):
+    """One line for the per-request part of the prompt."""
+    cautions = ", ".join(findings["cautions"]) or "none"
+    return f"no red flags or absolute contraindications found; cautions: {cautions}"
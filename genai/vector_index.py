@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+import metrics
+
+
+INDEX_DIR = Path(os.getenv("NUMPY_INDEX_DIR", Path(__file__).parent / ".cache" / "numpy-index"))
+# seconds between checks of the index pointer; 0 checks on every search
+RELOAD_INTERVAL = float(os.getenv("NUMPY_INDEX_RELOAD_INTERVAL", "5"))
+
+# names the version directory readers should load
+POINTER = "current"
+
+
+def index_exists(index_dir=INDEX_DIR):
+    return (Path(index_dir) / POINTER).exists()
+
+
+def write_index(rows, vectors, index_dir=INDEX_DIR):
+    """Write (id, page_content, metadata) rows and their vectors for NumpyVectorIndex.
+
+    Vectors are L2-normalized up front so a search is a single matrix
+    product. Both files go into a fresh version directory and the
+    ``current`` pointer is swapped to it with one os.replace, so readers
+    load either the old pair or the new one, never a mix. The previous
+    version is kept for readers still mapping it; older ones are removed.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(rows), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+
+    version = f"v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    version_dir = index_dir / version
+    version_dir.mkdir()
+    np.save(version_dir / "vectors.npy", np.ascontiguousarray(matrix))
+    with open(version_dir / "docs.jsonl", "w", encoding="utf-8") as f:
+        for id_, content, metadata in rows:
+            f.write(json.dumps({"id": id_, "page_content": content, "metadata": metadata}) + "\n")
+
+    previous = _read_pointer(index_dir)
+    tmp_pointer = index_dir / f"{POINTER}.{version}.tmp"
+    tmp_pointer.write_text(version, encoding="utf-8")
+    os.replace(tmp_pointer, index_dir / POINTER)
+
+    for path in index_dir.iterdir():
+        if path.is_dir() and path.name.startswith("v") and path.name not in (version, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _read_pointer(index_dir):
+    try:
+        return (Path(index_dir) / POINTER).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+
+
+class NumpyVectorIndex:
+    """In-process cosine top-k over a memory-mapped float32 matrix.
+
+    Drop-in for QdrantRetriever (asimilarity_search /
+    asimilarity_search_by_vector) with no network hop. The matrix is
+    mmapped read-only, so every worker process on a host shares the same
+    page cache copy. At most every ``reload_interval`` seconds the
+    ``current`` pointer is stat'ed, and a re-run of indexing.py is picked
+    up without a restart.
+    """
+
+    def __init__(self, embedding, index_dir=INDEX_DIR, reload_interval=RELOAD_INTERVAL):
+        self.embedding = embedding
+        self.index_dir = Path(index_dir)
+        self.reload_interval = reload_interval
+        self.version = None
+        self._pointer_mtime = None
+        self._checked_at = 0.0
+        self._load()
+
+    def _load(self):
+        pointer = self.index_dir / POINTER
+        try:
+            mtime = pointer.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"no index in {self.index_dir}; run indexing.py") from None
+        version = _read_pointer(self.index_dir)
+        if version != self.version:
+            version_dir = self.index_dir / version
+            matrix = np.load(version_dir / "vectors.npy", mmap_mode="r")
+            with open(version_dir / "docs.jsonl", encoding="utf-8") as f:
+                documents = [
+                    Document(page_content=doc["page_content"], metadata=doc["metadata"])
+                    for doc in map(json.loads, f)
+                ]
+            if len(documents) != len(matrix):
+                raise ValueError(f"{version_dir} is inconsistent; re-run indexing.py")
+            # one assignment, so a search never pairs one version's matrix with another's documents
+            self._snapshot = (matrix, documents)
+            self.version = version
+        self._pointer_mtime = mtime
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            if (self.index_dir / POINTER).stat().st_mtime_ns != self._pointer_mtime:
+                self._load()
+        except (OSError, ValueError):
+            # keep serving the version already mapped
+            pass
+
+    @property
+    def matrix(self):
+        return self._snapshot[0]
+
+    @property
+    def documents(self):
+        return self._snapshot[1]
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search_batch(self, vectors, k=4):
+        """Top-k (row, score) pairs for each query vector, best first."""
+        self._refresh()
+        return self._search(self.matrix, vectors, k)
+
+    @staticmethod
+    def _search(matrix, vectors, k):
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, matrix.shape[1])
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ matrix.T
+
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [[] for _ in queries]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [list(zip(rows.tolist(), row_scores.tolist())) for rows, row_scores in zip(top, top_scores)]
+
+    def similarity_search_by_vector_batch(self, vectors, k=4):
+        self._refresh()
+        matrix, documents = self._snapshot
+        with metrics.stage("vector_search"):
+            hits = self._search(matrix, vectors, k)
+        return [[documents[row] for row, _ in query_hits] for query_hits in hits]
+
+    async def asimilarity_search_by_vector(self, vector, k=4):
+        # a few hundred rows: the matmul is microseconds, no need for a thread
+        return self.similarity_search_by_vector_batch([vector], k)[0]
+
+    async def asimilarity_search(self, query, k=4, vector=None):
+        if vector is None:
+            vector = await self.embedding.aembed_query(query)
+        return await self.asimilarity_search_by_vector(vector, k=k)
+
+    async def abatch_similarity_search(self, queries, k=4, vectors=None):
+        if not queries:
+            return []
+        if vectors is None:
+            vectors = await self.embedding.aembed_queries(queries)
+        return self.similarity_search_by_vector_batch(vectors, k)
+
+    async def aclose(self):
+        pass